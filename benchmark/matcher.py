@@ -0,0 +1,77 @@
+"""
+Blacklist and whitelist keyword matching benchmark, list scan against the compiled matchers
+
+Usage: python -m benchmark.matcher --keywords 2000 --urls 20000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+from collections import defaultdict
+from timeit import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.matcher import KeywordMatcher
+from utils.tools import check_url_by_keywords
+from utils.whitelist import WhitelistMatcher, is_url_whitelisted
+
+
+def random_word(rng: random.Random, length: int) -> str:
+    return "".join(rng.choices(string.ascii_lowercase + string.digits, k=length))
+
+
+def build_urls(rng: random.Random, count: int) -> list[str]:
+    return [
+        f"http://{random_word(rng, 8)}.example.com:{rng.randint(80, 9000)}/{random_word(rng, 6)}/"
+        f"{random_word(rng, 10)}.m3u8?token={random_word(rng, 16)}"
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword matching benchmark")
+    parser.add_argument("--keywords", type=int, default=2000, help="Number of blacklist and whitelist keywords")
+    parser.add_argument("--urls", type=int, default=20000, help="Number of urls to match")
+    parser.add_argument("--channels", type=int, default=200, help="Number of channels the whitelist spreads over")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    urls = build_urls(rng, args.urls)
+    keywords = [random_word(rng, rng.randint(5, 12)) for _ in range(args.keywords)]
+    keywords += [url.split("/")[2] for url in rng.sample(urls, max(1, args.urls // 100))]
+    channel_names = [f"Channel {i}" for i in range(args.channels)]
+    exact_map, keyword_map = defaultdict(list), defaultdict(list)
+    for keyword in keywords:
+        keyword_map[rng.choice(channel_names + [""])].append(keyword)
+    for url in rng.sample(urls, max(1, args.urls // 100)):
+        exact_map[rng.choice(channel_names + [""])].append(url)
+    whitelist_maps = (exact_map, keyword_map)
+    whitelist_matcher = WhitelistMatcher(whitelist_maps)
+    blacklist_matcher = KeywordMatcher(keywords)
+    names = [rng.choice(channel_names) for _ in urls]
+
+    def run_blacklist(blacklist):
+        return sum(check_url_by_keywords(url, blacklist) for url in urls)
+
+    def run_whitelist(data_map):
+        return sum(is_url_whitelisted(data_map, url, name) for url, name in zip(urls, names))
+
+    assert run_blacklist(keywords) == run_blacklist(blacklist_matcher)
+    assert run_whitelist(whitelist_maps) == run_whitelist(whitelist_matcher)
+    compile_time = timeit(lambda: (KeywordMatcher(keywords), WhitelistMatcher(whitelist_maps)), number=1)
+    print(f"Keywords: {len(keywords)}, URLs: {len(urls)}, Compile: {compile_time * 1000:.1f} ms")
+    for label, func, plain, compiled in (
+            ("Blacklist", run_blacklist, keywords, blacklist_matcher),
+            ("Whitelist", run_whitelist, whitelist_maps, whitelist_matcher),
+    ):
+        plain_time = timeit(lambda: func(plain), number=1)
+        compiled_time = timeit(lambda: func(compiled), number=1)
+        print(f"{label}: List: {plain_time * 1000:.1f} ms, Matcher: {compiled_time * 1000:.1f} ms, "
+              f"Speedup: {plain_time / compiled_time if compiled_time else 0:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Channel name formatting benchmark, plain formatting against the cached and batched formatting
+
+Usage: python -m benchmark.name --names 50000 --unique 2000
+"""
+import argparse
+import os
+import random
+import sys
+from timeit import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.constants as constants
+from utils.tools import format_name, format_names, format_name_cache, get_format_name_stats, opencc_t2s
+
+BASE_NAMES = ["CCTV-1 综合", "CCTV5+ 體育賽事", "湖南衛視 HD", "浙江卫视「高清」", "鳳凰中文台", "TVB Jade", "HBO (HD)",
+              "东方卫视-4K", "翡翠台", "Discovery Channel"]
+
+
+def plain_format_name(name: str) -> str:
+    name = opencc_t2s.convert(name)
+    name = constants.sub_pattern.sub("", name)
+    for old, new in constants.replace_dict.items():
+        name = name.replace(old, new)
+    return name.lower()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Channel name formatting benchmark")
+    parser.add_argument("--names", type=int, default=50000, help="Number of names to format")
+    parser.add_argument("--unique", type=int, default=2000, help="Number of distinct names")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    unique = [f"{rng.choice(BASE_NAMES)} {i}" for i in range(args.unique)]
+    names = [rng.choice(unique) for _ in range(args.names)]
+
+    assert [plain_format_name(name) for name in names] == format_names(names)
+    format_name_cache.clear()
+    plain_time = timeit(lambda: [plain_format_name(name) for name in names], number=1)
+    cached_time = timeit(lambda: [format_name(name) for name in names], number=1)
+    format_name_cache.clear()
+    batch_time = timeit(lambda: format_names(names), number=1)
+    stats = get_format_name_stats()
+    print(f"Names: {len(names)}, Unique: {len(unique)}")
+    print(f"Plain: {plain_time * 1000:.1f} ms, Cached: {cached_time * 1000:.1f} ms, Batch: {batch_time * 1000:.1f} ms, "
+          f"Speedup: {plain_time / min(cached_time, batch_time):.1f}x")
+    print(f"Cache: Hits: {stats['hits']}, Misses: {stats['misses']}, Hit Rate: {stats['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
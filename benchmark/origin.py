@@ -0,0 +1,180 @@
+import asyncio
+import os
+import random
+import threading
+from collections import defaultdict
+from time import time
+
+from aiohttp import web
+
+TS_PACKET_SIZE = 188
+CHUNK_SIZE = 64 * 1024
+H264_SPS_1080P = bytes.fromhex("67640028acd940780227e5c044000003000400000300c83c60c658")
+
+
+def _ts_packet(pid: int, unit_start: bool, payload: bytes) -> bytes:
+    """
+    Build a TS packet, padding the payload with an adaptation field
+    """
+    payload = payload[:TS_PACKET_SIZE - 4]
+    header = bytes([0x47, (0x40 if unit_start else 0) | (pid >> 8), pid & 0xFF])
+    stuffing = TS_PACKET_SIZE - 4 - len(payload)
+    if not stuffing:
+        return header + b"\x10" + payload
+    adaptation = bytes([stuffing - 1]) + (b"\x00" + b"\xff" * (stuffing - 2) if stuffing > 1 else b"")
+    return header + b"\x30" + adaptation + payload
+
+
+def build_segment(size: int) -> bytes:
+    """
+    Build a synthetic MPEG-TS segment of about the size with a 1080p H.264 video stream
+    """
+    pat = bytes([0, 0x00, 0xB0, 13, 0, 1, 0xC1, 0, 0, 0, 1, 0xE1, 0x00]) + b"\x00" * 4
+    pmt = bytes([0, 0x02, 0xB0, 18, 0, 1, 0xC1, 0, 0, 0xE1, 0x01, 0xF0, 0, 0x1B, 0xE1, 0x01, 0xF0, 0]) + b"\x00" * 4
+    pes = (b"\x00\x00\x01\xe0\x00\x00\x80\x80\x05" + b"\x21" * 5 + b"\x00\x00\x00\x01\x09\xf0"
+           + b"\x00\x00\x00\x01" + H264_SPS_1080P + b"\x00\x00\x00\x01\x68\xeb")
+    packets = [_ts_packet(0, True, pat), _ts_packet(0x100, True, pmt), _ts_packet(0x101, True, pes)]
+    filler = os.urandom(TS_PACKET_SIZE - 4)
+    packets.extend(_ts_packet(0x101, False, filler) for _ in range(max(0, size // TS_PACKET_SIZE - 3)))
+    return b"".join(packets)
+
+
+class MockOrigin:
+    """
+    Local HLS origin serving synthetic master and media playlists and TS segments,
+    with configurable latency, bandwidth, error rate and redirects
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, bandwidth: float = 0,
+                 error_rate: float = 0.0, redirect_rate: float = 0.0, segment_size: int = 512 * 1024,
+                 segments: int = 6, seed: int = None):
+        """
+        :param latency: Delay before each response, in seconds
+        :param bandwidth: Bytes per second of each response body, 0 for unlimited
+        :param error_rate: Ratio of requests answered with 503
+        :param redirect_rate: Ratio of streams whose url redirects to the real playlist
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.redirect_rate = redirect_rate
+        self.segments = segments
+        self.segment = build_segment(segment_size)
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.stream_times: dict[str, list[float]] = defaultdict(lambda: [0.0, 0.0])
+        self._runner = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def urls(self, count: int) -> list[str]:
+        """
+        Get the stream urls of the origin
+        """
+        return [f"{self.base_url}/{stream_id}/index.m3u8" for stream_id in range(count)]
+
+    def get_stream_latencies(self) -> list[float]:
+        """
+        Get the time from the first request to the last response of each stream, in seconds
+        """
+        return [end - start for start, end in self.stream_times.values() if end >= start]
+
+    def _is_redirect(self, stream_id: str) -> bool:
+        return random.Random(f"{stream_id}").random() < self.redirect_rate
+
+    async def _respond(self, request: web.Request, body: bytes, content_type: str) -> web.StreamResponse:
+        stream_id = request.match_info["stream_id"]
+        times = self.stream_times[stream_id]
+        if not times[0]:
+            times[0] = time()
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            times[1] = time()
+            return web.Response(status=503)
+        response = web.StreamResponse(headers={"Content-Type": content_type})
+        response.content_length = len(body)
+        await response.prepare(request)
+        if request.method != "HEAD":
+            for i in range(0, len(body), CHUNK_SIZE):
+                chunk = body[i:i + CHUNK_SIZE]
+                await response.write(chunk)
+                self.bytes_sent += len(chunk)
+                if self.bandwidth:
+                    await asyncio.sleep(len(chunk) / self.bandwidth)
+        await response.write_eof()
+        times[1] = time()
+        return response
+
+    async def _index(self, request: web.Request) -> web.StreamResponse:
+        stream_id = request.match_info["stream_id"]
+        if self._is_redirect(stream_id):
+            raise web.HTTPFound(f"{self.base_url}/{stream_id}/live.m3u8")
+        return await self._master(request)
+
+    async def _master(self, request: web.Request) -> web.StreamResponse:
+        body = "#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=4000000,RESOLUTION=1920x1080\nmedia.m3u8\n"
+        return await self._respond(request, body.encode(), "application/vnd.apple.mpegurl")
+
+    async def _media(self, request: web.Request) -> web.StreamResponse:
+        body = "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:4\n#EXT-X-MEDIA-SEQUENCE:0\n" + "".join(
+            f"#EXTINF:4.0,\nseg{i}.ts\n" for i in range(self.segments)
+        )
+        return await self._respond(request, body.encode(), "application/vnd.apple.mpegurl")
+
+    async def _segment(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, self.segment, "video/mp2t")
+
+    async def start(self) -> str:
+        """
+        Start the origin, return the base url
+        """
+        app = web.Application()
+        app.router.add_get("/{stream_id}/index.m3u8", self._index)
+        app.router.add_get("/{stream_id}/live.m3u8", self._master)
+        app.router.add_get("/{stream_id}/media.m3u8", self._media)
+        app.router.add_get("/{stream_id}/{segment}.ts", self._segment)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.base_url
+
+    async def stop(self) -> None:
+        """
+        Stop the origin
+        """
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self) -> str:
+        """
+        Start the origin on its own event loop in a background thread, so the serving work does not
+        run on the event loop of the client under test, return the base url
+        """
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        return asyncio.run_coroutine_threadsafe(self.start(), self._loop).result()
+
+    def stop_in_thread(self) -> None:
+        """
+        Stop the origin started by start_in_thread and its event loop
+        """
+        if not self._loop:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = None
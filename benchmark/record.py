@@ -0,0 +1,84 @@
+"""
+Channel data memory benchmark, plain dicts against the slotted channel records
+
+Usage: python -m benchmark.record --records 300000
+"""
+import argparse
+import copy
+import os
+import pickle
+import random
+import sys
+import tracemalloc
+from timeit import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.record import ChannelRecord
+
+ORIGINS = ["subscribe", "local", "whitelist", "hls"]
+LOCATIONS = ["中国-北京-北京", "中国-广东-广州", "中国-上海-上海", None]
+ISPS = ["电信", "联通", "移动", None]
+
+
+def build_items(rng: random.Random, count: int, hosts: int) -> list[dict]:
+    """
+    Build the channel data dicts, with the strings created per item like when parsed from the sources
+    """
+    items = []
+    for index in range(count):
+        host = f"{rng.randrange(hosts)}.example.com:8080"
+        url = f"http://{host}/live/{index}/index.m3u8"
+        items.append({
+            "id": hash(url),
+            "url": url,
+            "host": "".join(host),
+            "date": None,
+            "delay": None,
+            "speed": None,
+            "resolution": rng.choice(["1920x1080", "1280x720", None]),
+            "origin": "".join(rng.choice(ORIGINS)),
+            "ipv_type": "".join(rng.choice(["ipv4", "ipv6"])),
+            "location": rng.choice(LOCATIONS),
+            "isp": rng.choice(ISPS),
+            "headers": None,
+            "catchup": None,
+            "extra_info": "",
+        })
+    return items
+
+
+def measure(factory) -> tuple[object, float]:
+    """
+    Build the data with the factory, return it and the memory allocated in MB
+    """
+    tracemalloc.start()
+    data = factory()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return data, size / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Channel data memory benchmark")
+    parser.add_argument("--records", type=int, default=300000, help="Number of channel data items")
+    parser.add_argument("--hosts", type=int, default=5000, help="Number of distinct hosts")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    items = build_items(random.Random(args.seed), args.records, args.hosts)
+    dicts, dict_size = measure(lambda: [dict(item) for item in items])
+    records, record_size = measure(lambda: [ChannelRecord(item) for item in items])
+    assert all(record == item for record, item in zip(records, dicts))
+    assert pickle.loads(pickle.dumps(records[:1000])) == dicts[:1000]
+    print(f"Records: {args.records}")
+    print(f"Memory: Dict: {dict_size:.1f} MB, Record: {record_size:.1f} MB, Saved: {1 - record_size / dict_size:.1%}")
+    print(f"Pickle: Dict: {len(pickle.dumps(dicts)) / 1024 / 1024:.1f} MB, "
+          f"Record: {len(pickle.dumps(records)) / 1024 / 1024:.1f} MB")
+    sample = slice(0, min(args.records, 20000))
+    print(f"Deepcopy of {sample.stop}: Dict: {timeit(lambda: copy.deepcopy(dicts[sample]), number=1) * 1000:.1f} ms, "
+          f"Record: {timeit(lambda: copy.deepcopy(records[sample]), number=1) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Speed test benchmark against a local mock origin, fully offline.
+The origin serves from its own event loop in a background thread, the loop lag is of the client only
+
+Usage: python -m benchmark.speed --urls 2000 --channels 100 --latency 0.02 --bandwidth 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from time import time
+
+os.environ["NO_PROXY"] = ",".join(filter(None, [os.environ.get("NO_PROXY"), "127.0.0.1", "localhost"]))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.constants as constants
+from benchmark.origin import MockOrigin
+from utils.channel import test_speed
+from utils.speed import clear_cache
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def get_percentile(values: list[float], percent: float) -> float:
+    """
+    Get the percentile of the values with the nearest rank
+    """
+    if not values:
+        return 0
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+def get_peak_rss() -> float | None:
+    """
+    Get the peak resident set size of the process in MB
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def monitor_loop_lag(lags: list[float], interval: float = 0.05):
+    """
+    Record how late the event loop wakes up from a sleep of the interval
+    """
+    while True:
+        start = time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time() - start - interval))
+
+
+def build_data(urls: list[str], channels: int) -> dict:
+    """
+    Build the channel data of the urls, spread over the channels
+    """
+    data = {"Benchmark": {}}
+    for index, url in enumerate(urls):
+        name = f"Channel {index % channels}"
+        data["Benchmark"].setdefault(name, []).append({
+            "id": hash(url),
+            "url": url,
+            "host": url.split("/", 3)[2],
+            "origin": "subscribe",
+            "ipv_type": "ipv4",
+            "date": None,
+            "resolution": None,
+            "headers": None,
+            "extra_info": "",
+        })
+    return data
+
+
+async def run(args) -> dict:
+    origin = MockOrigin(
+        latency=args.latency,
+        bandwidth=args.bandwidth * 1024 * 1024,
+        error_rate=args.error_rate,
+        redirect_rate=args.redirect_rate,
+        segment_size=args.segment_size * 1024,
+        seed=args.seed,
+    )
+    origin.start_in_thread()
+    constants.speed_test_log_path = os.path.join(tempfile.gettempdir(), "iptv-api-benchmark", "speed_test.log")
+    clear_cache()
+    data = build_data(origin.urls(args.urls), args.channels)
+    lags = []
+    monitor = asyncio.create_task(monitor_loop_lag(lags))
+    completed = 0
+
+    def on_task_complete(*_):
+        nonlocal completed
+        completed += 1
+
+    start_time = time()
+    try:
+        await test_speed(data, on_task_complete=on_task_complete)
+    finally:
+        elapsed = time() - start_time
+        monitor.cancel()
+        origin.stop_in_thread()
+    latencies = origin.get_stream_latencies()
+    return {
+        "urls": completed,
+        "time": elapsed,
+        "urls_per_second": completed / elapsed if elapsed > 0 else 0,
+        "p50": get_percentile(latencies, 50),
+        "p95": get_percentile(latencies, 95),
+        "requests": origin.requests,
+        "bytes": origin.bytes_sent,
+        "peak_rss": get_peak_rss(),
+        "max_lag": max(lags, default=0),
+        "avg_lag": sum(lags) / len(lags) if lags else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed test benchmark against a local mock origin")
+    parser.add_argument("--urls", type=int, default=1000, help="Number of urls to test")
+    parser.add_argument("--channels", type=int, default=50, help="Number of channels the urls are spread over")
+    parser.add_argument("--latency", type=float, default=0.02, help="Delay before each response, in seconds")
+    parser.add_argument("--bandwidth", type=float, default=0, help="MB/s of each response body, 0 for unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Ratio of requests answered with 503")
+    parser.add_argument("--redirect-rate", type=float, default=0.1, help="Ratio of urls redirecting to the playlist")
+    parser.add_argument("--segment-size", type=int, default=512, help="Size of each TS segment, in KB")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed of the error responses")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    peak_rss = result["peak_rss"]
+    print(f"URLs: {result['urls']}, Time: {result['time']:.2f} s, URLs/sec: {result['urls_per_second']:.2f}")
+    print(f"Latency: p50: {result['p50'] * 1000:.0f} ms, p95: {result['p95'] * 1000:.0f} ms")
+    print(f"Origin: Requests: {result['requests']}, Bytes: {result['bytes'] / 1024 / 1024:.2f} MB")
+    print(f"Peak RSS: {f'{peak_rss:.1f} MB' if peak_rss is not None else 'N/A'}")
+    print(f"Loop Lag: Max: {result['max_lag'] * 1000:.1f} ms, Avg: {result['avg_lag'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
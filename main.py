@@ -1,7 +1,7 @@
 import asyncio
-import copy
 import datetime
 import gzip
+import multiprocessing
 import os
 import pickle
 from time import time
@@ -12,13 +12,19 @@ from tqdm import tqdm
 
 import utils.constants as constants
 import utils.frozen as frozen
+import utils.speed_store as speed_store
+import utils.subscribe_stats as subscribe_stats
+import utils.subscribe_store as subscribe_store
 from updates.epg import get_epg
 from updates.epg.tools import write_to_xml, compress_to_gz
 from updates.subscribe import get_channels_by_subscribe_urls
 from utils.aggregator import ResultAggregator
-from utils.channel import get_channel_items, append_total_data, test_speed
+from utils.channel import (
+    get_channel_items, append_total_data, resolve_channel_hosts, test_speed, ip_checker, clear_write_fragment_cache
+)
 from utils.config import config
 from utils.i18n import t
+from utils.matcher import KeywordMatcher
 from utils.speed import clear_cache
 from utils.tools import (
     get_pbar_remaining,
@@ -33,7 +39,7 @@ from utils.tools import (
     parse_times,
 )
 from utils.types import CategoryChannelData
-from utils.whitelist import load_whitelist_maps, get_section_entries
+from utils.whitelist import load_whitelist_maps, get_section_entries, WhitelistMatcher
 
 ProgressCallback = Callable[..., Any]
 
@@ -110,8 +116,8 @@ class UpdateSource:
     # stage 1: prepare
     # ----------------------------
     def _prepare_channel_data(self):
-        self.whitelist_maps = load_whitelist_maps(constants.whitelist_path)
-        self.blacklist = get_urls_from_file(constants.blacklist_path, pattern_search=False)
+        self.whitelist_maps = WhitelistMatcher(load_whitelist_maps(constants.whitelist_path))
+        self.blacklist = KeywordMatcher(get_urls_from_file(constants.blacklist_path, pattern_search=False))
         self.channel_items = get_channel_items(self.whitelist_maps, self.blacklist)
         self.channel_data = {}
 
@@ -126,6 +132,8 @@ class UpdateSource:
     # stage 2: fetch subscribe/epg (concurrent)
     # ----------------------------
     async def _fetch_subscribe(self, channel_names: list[str]):
+        # Loaded before anything can return early, the stats are saved at the end of every run
+        subscribe_stats.load(constants.subscribe_stats_path)
         whitelist_subscribe_urls, default_subscribe_urls = get_section_entries(
             constants.subscribe_path,
             pattern=constants.url_pattern,
@@ -142,12 +150,16 @@ class UpdateSource:
             print(t("msg.no_subscribe_urls").format(file=constants.subscribe_path))
             return {}
 
-        return await get_channels_by_subscribe_urls(
-            subscribe_urls,
-            names=channel_names,
-            whitelist=whitelist_subscribe_urls,
-            callback=self.update_progress,
-        )
+        subscribe_store.load(constants.subscribe_cache_path)
+        try:
+            return await get_channels_by_subscribe_urls(
+                subscribe_urls,
+                names=channel_names,
+                whitelist=whitelist_subscribe_urls,
+                callback=self.update_progress,
+            )
+        finally:
+            subscribe_store.save(constants.subscribe_cache_path)
 
     async def _fetch_epg(self, channel_names: list[str]):
         return await get_epg(channel_names, callback=self.update_progress)
@@ -185,6 +197,7 @@ class UpdateSource:
     # stage 3: aggregator lifecycle
     # ----------------------------
     async def _start_aggregator(self, cache: dict):
+        clear_write_fragment_cache()
         self.aggregator = ResultAggregator(
             base_data=self.channel_data,
             first_channel_name=self.channel_names[0] if self.channel_names else None,
@@ -198,6 +211,7 @@ class UpdateSource:
         if self.aggregator:
             await self.aggregator.stop()
             self.aggregator = None
+        clear_write_fragment_cache()
 
     # ----------------------------
     # stage 4: speed test
@@ -207,7 +221,7 @@ class UpdateSource:
         Run speed test on the channel data and return the test results.
         """
         urls_total = get_urls_len(self.channel_data)
-        test_data = copy.deepcopy(self.channel_data)
+        test_data = {cate: dict(channel_obj) for cate, channel_obj in self.channel_data.items()}
 
         process_nested_dict(
             test_data,
@@ -293,6 +307,7 @@ class UpdateSource:
             self.tasks = []
             self._write_epg_files_if_needed()
 
+            await resolve_channel_hosts(self.channel_items.items(), self.subscribe_result)
             append_total_data(
                 self.channel_items.items(),
                 self.channel_data,
@@ -305,11 +320,17 @@ class UpdateSource:
 
             await self._start_aggregator(cache)
             try:
-                cache_result = copy.deepcopy(self.channel_data)
+                cache_result = self.channel_data
 
                 if config.open_speed_test:
                     clear_cache()
+                    speed_store.load(constants.speed_test_cache_path)
                     test_result = await self._run_speed_test()
+                    speed_store.save(constants.speed_test_cache_path)
+                    subscribe_stats.record_test_result(test_result)
+                    if not self.aggregator.is_last:
+                        self.aggregator.is_last = True
+                        await self.aggregator.flush_once(force=True)
                     cache_result = merge_objects(cache_result, test_result, match_key="url")
                 else:
                     self.aggregator.is_last = True
@@ -322,6 +343,11 @@ class UpdateSource:
                 cache_result = merge_objects(cache, cache_result, match_key="url")
                 self._save_cache(cache_result)
                 frozen.save(constants.frozen_path)
+            ip_checker.save()
+            if config.open_method.get("subscribe"):
+                subscribe_stats.finish_run(tested=config.open_speed_test)
+                subscribe_stats.log_report()
+                subscribe_stats.save(constants.subscribe_stats_path)
 
             print(
                 t("msg.update_completed").format(
@@ -414,6 +440,7 @@ class UpdateSource:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     info = get_version_info()
     print(t("msg.version_info").format(name=info["name"], version=info["version"]))
     loop = asyncio.new_event_loop()
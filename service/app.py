@@ -197,6 +197,18 @@ def show_nomatch_log():
     return response
 
 
+@app.route("/log/subscribe")
+def show_subscribe_log():
+    if os.path.exists(constants.subscribe_log_path):
+        with open(constants.subscribe_log_path, "r", encoding="utf-8") as file:
+            content = file.read()
+    else:
+        content = constants.waiting_tip
+    response = make_response(content)
+    response.mimetype = "text/plain"
+    return response
+
+
 @app.route('/hls_proxy/<channel_id>', methods=['GET'])
 def hls_proxy(channel_id):
     if not channel_id:
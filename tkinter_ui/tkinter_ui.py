@@ -1,4 +1,5 @@
 import datetime
+import multiprocessing
 import os
 import sys
 
@@ -270,6 +271,7 @@ def get_root_location(root):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     tkinter_ui = TkinterUI(root)
     tkinter_ui.init_UI()
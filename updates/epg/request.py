@@ -14,7 +14,7 @@ from utils.channel import format_channel_name
 from utils.config import config
 from utils.i18n import t
 from utils.retry import retry_func
-from utils.tools import get_pbar_remaining, get_urls_from_file, opencc_t2s, join_url
+from utils.tools import get_pbar_remaining, get_urls_from_file, convert_t2s, join_url
 
 
 def parse_epg(epg_content):
@@ -34,13 +34,14 @@ def parse_epg(epg_content):
         display_name = channel.find('display-name').text
         channels[channel_id] = display_name
 
-    for programme in root.findall('programme'):
+    programme_list = root.findall('programme')
+    titles = convert_t2s([programme.find('title').text for programme in programme_list])
+    for programme, channel_text in zip(programme_list, titles):
         channel_id = programme.get('channel')
         channel_start = datetime.strptime(
             re.sub(r'\s+', '', programme.get('start')), "%Y%m%d%H%M%S%z")
         channel_stop = datetime.strptime(
             re.sub(r'\s+', '', programme.get('stop')), "%Y%m%d%H%M%S%z")
-        channel_text = opencc_t2s.convert(programme.find('title').text)
         channel_elem = ET.SubElement(
             root, 'programme', attrib={"channel": channel_id, "start": channel_start.strftime("%Y%m%d%H%M%S +0800"),
                                        "stop": channel_stop.strftime("%Y%m%d%H%M%S +0800")})
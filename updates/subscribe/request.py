@@ -1,24 +1,54 @@
+import asyncio
+import hashlib
 import os
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
 from logging import INFO
 from time import time
 
+from aiohttp import ClientSession, ClientTimeout
 from tqdm.asyncio import tqdm_asyncio
 
 import utils.constants as constants
+import utils.subscribe_stats as subscribe_stats
+import utils.subscribe_store as subscribe_store
 from utils.channel import format_channel_name
 from utils.config import config
 from utils.i18n import t
-from utils.requests.tools import get_soup_requests
-from utils.retry import retry_func
+from utils.playlist import PlaylistParser
+from utils.requests.pool import ConnectionPool
+from utils.requests.tools import headers
+from utils.retry import retry_async_func
 from utils.tools import (
-    merge_objects,
     get_pbar_remaining,
-    get_name_value,
     get_logger, join_url
 )
 
+chunk_size = 64 * 1024
+
+
+def merge_subscribe_results(results, sources=None) -> dict[str, list]:
+    """
+    Merge the per source results in order, the first value of each (channel, url) wins,
+    so the whitelist sources sorted in front take precedence
+    :param results: The results of the sources in order
+    :param sources: The urls of the sources, to record the urls contributed by each
+    """
+    merged = {}
+    seen = set()
+    for index, result in enumerate(results):
+        source = sources[index] if sources else None
+        for name, values in result.items():
+            channel_values = merged.get(name)
+            if channel_values is None:
+                channel_values = merged[name] = []
+            for value in values:
+                key = (name, value["url"])
+                if key not in seen:
+                    seen.add(key)
+                    channel_values.append(value)
+                if source:
+                    subscribe_stats.record_url(source, value["url"])
+    return merged
+
 
 async def get_channels_by_subscribe_urls(
         urls,
@@ -41,7 +71,8 @@ async def get_channels_by_subscribe_urls(
     if whitelist:
         index_map = {u: i for i, u in enumerate(whitelist)}
         urls.sort(key=lambda u: index_map.get(u, len(whitelist)))
-    subscribe_results = {}
+    subscribe_stats.reset_run()
+    urls = subscribe_stats.select_sources(urls, protected=whitelist or ())
     subscribe_urls_len = len(urls)
     pbar = tqdm_asyncio(
         total=subscribe_urls_len,
@@ -56,66 +87,114 @@ async def get_channels_by_subscribe_urls(
         )
     logger = get_logger(constants.nomatch_log_path, level=INFO, init=True)
 
-    def process_subscribe_channels(subscribe_info: str | dict) -> defaultdict:
-        subscribe_url = subscribe_info
-        channels = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    open_headers = config.open_headers
+    request_limit = max(config.subscribe_request_limit, 1)
+    semaphore = asyncio.Semaphore(request_limit)
+    timeout = ClientTimeout(sock_connect=config.request_timeout, sock_read=config.request_timeout)
+
+    async def fetch_subscribe_channels(session: ClientSession, subscribe_url: str, fetch_stats: dict) -> dict:
+        """
+        Stream the subscribe url, the lines are parsed as the chunks arrive,
+        the cached parse is reused if the source is not modified or its body hash is unchanged
+        """
+        channels = {}
+        seen = set()
+        fetch_stats["bytes"] = 0
         in_whitelist = whitelist and (subscribe_url in whitelist)
+        parser = PlaylistParser(open_headers=open_headers)
+
+        def add_items(items):
+            for item in items:
+                data_name = item.get("name", "").strip()
+                url = item.get("value", "").strip()
+                if data_name and url:
+                    name = format_channel_name(data_name)
+                    if names and name not in names:
+                        logger.info(f"{data_name},{url}")
+                        continue
+                    url_partition = url.partition("$")
+                    url = url_partition[0]
+                    info = url_partition[2]
+                    value = {
+                        "url": url,
+                        "headers": item.get("headers", None),
+                        "extra_info": info
+                    }
+                    if in_whitelist:
+                        value["origin"] = "whitelist"
+                    key = (name, url)
+                    if key not in seen:
+                        seen.add(key)
+                        channels.setdefault(name, []).append(value)
+
+        entry = subscribe_store.get(subscribe_url, open_headers)
+        request_headers = {**headers, **subscribe_store.get_validators(entry)}
+        async with session.get(subscribe_url, headers=request_headers, timeout=timeout) as response:
+            if entry and response.status == 304:
+                subscribe_store.touch(subscribe_url)
+                add_items(entry["items"])
+                return channels
+            body_hash = hashlib.sha1()
+            items = [] if subscribe_store.is_enabled() else None
+
+            def parse(parsed_items):
+                add_items(parsed_items)
+                if items is not None:
+                    items.extend(parsed_items)
+
+            # The body of a cached source is buffered and only parsed if its hash changed
+            chunks = [] if entry else None
+            async for chunk in response.content.iter_chunked(chunk_size):
+                body_hash.update(chunk)
+                fetch_stats["bytes"] += len(chunk)
+                if chunks is None:
+                    parse(parser.feed(chunk))
+                else:
+                    chunks.append(chunk)
+            body_digest = body_hash.hexdigest()
+            if entry and entry["hash"] == body_digest:
+                subscribe_store.touch(subscribe_url, etag=response.headers.get("ETag"),
+                                      last_modified=response.headers.get("Last-Modified"))
+                add_items(entry["items"])
+                return channels
+            for chunk in chunks or ():
+                parse(parser.feed(chunk))
+            parse(parser.close())
+            if parser.empty:
+                raise Exception(f"Empty response from {subscribe_url}")
+            if response.status == 200:
+                subscribe_store.put(subscribe_url, items, body_digest, etag=response.headers.get("ETag"),
+                                    last_modified=response.headers.get("Last-Modified"), open_headers=open_headers)
+        return channels
+
+    async def process_subscribe_channels(session: ClientSession, subscribe_url: str) -> dict:
+        channels = {}
+        fetch_stats = {"bytes": 0}
+        fetch_start_time = None
+        failed = False
         try:
-            response = None
-            try:
-                response = (
-                    retry_func(
-                        lambda: get_soup_requests(
-                            subscribe_url, timeout=config.request_timeout
-                        ),
+            async with semaphore:
+                fetch_start_time = time()
+                channels = await (
+                    retry_async_func(
+                        lambda: fetch_subscribe_channels(session, subscribe_url, fetch_stats),
                         name=subscribe_url,
                     )
                     if retry
-                    else get_soup_requests(subscribe_url, timeout=config.request_timeout)
+                    else fetch_subscribe_channels(session, subscribe_url, fetch_stats)
                 )
-            except Exception as e:
-                print(f"{subscribe_url}: {e}")
-            if response:
-                response.encoding = "utf-8"
-                content = response.text
-                m3u_type = True if "#EXTM3U" in content else False
-                data = get_name_value(
-                    content,
-                    pattern=(
-                        constants.multiline_m3u_pattern
-                        if m3u_type
-                        else constants.multiline_txt_pattern
-                    ),
-                    open_headers=config.open_headers if m3u_type else False
-                )
-                for item in data:
-                    data_name = item.get("name", "").strip()
-                    url = item.get("value", "").strip()
-                    if data_name and url:
-                        name = format_channel_name(data_name)
-                        if names and name not in names:
-                            logger.info(f"{data_name},{url}")
-                            continue
-                        url_partition = url.partition("$")
-                        url = url_partition[0]
-                        info = url_partition[2]
-                        value = {
-                            "url": url,
-                            "headers": item.get("headers", None),
-                            "extra_info": info
-                        }
-                        if in_whitelist:
-                            value["origin"] = "whitelist"
-                        if name in channels:
-                            if value not in channels[name]:
-                                channels[name].append(value)
-                        else:
-                            channels[name] = [value]
         except Exception as e:
+            failed = True
             if error_print:
-                print(f"Error on {subscribe_url}: {e}")
+                print(f"{subscribe_url}: {e}")
         finally:
-            logger.handlers.clear()
+            subscribe_stats.record_fetch(
+                subscribe_url,
+                elapsed=time() - fetch_start_time if fetch_start_time else 0,
+                size=fetch_stats["bytes"],
+                entries=sum(len(values) for values in channels.values()),
+                failed=failed,
+            )
             pbar.update()
             if callback:
                 callback(
@@ -126,14 +205,14 @@ async def get_channels_by_subscribe_urls(
                                                                                     start_time=start_time)),
                     int((pbar.n / subscribe_urls_len) * 100),
                 )
-            return channels
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = [
-            executor.submit(process_subscribe_channels, subscribe_url)
-            for subscribe_url in urls
-        ]
-        for future in futures:
-            subscribe_results = merge_objects(subscribe_results, future.result())
+        return channels
+
+    try:
+        async with ConnectionPool(limit=request_limit, limit_per_host=0) as session:
+            results = await asyncio.gather(
+                *(process_subscribe_channels(session, subscribe_url) for subscribe_url in urls)
+            )
+    finally:
+        logger.handlers.clear()
     pbar.close()
-    return subscribe_results
+    return merge_subscribe_results(results, sources=urls)
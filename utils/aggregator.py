@@ -1,15 +1,27 @@
 import asyncio
-import copy
+import heapq
+from bisect import insort
 from collections import defaultdict
+from collections.abc import Mapping
+from copy import copy
+from itertools import count
 from logging import INFO
-from typing import Any, Dict, Optional, Set, Tuple
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
 
 import utils.constants as constants
 from utils.channel import sort_channel_result, generate_channel_statistic, write_channel_to_file, retain_origin
 from utils.config import config
+from utils.speed import check_result_valid, default_ipv6_result
 from utils.tools import get_logger
 
 
+def get_speed_key(item: Mapping) -> float:
+    """
+    Get the sort key of the result, the faster the smaller
+    """
+    return -(item.get("speed") or 0)
+
+
 class ResultAggregator:
     """
     Aggregates test results and periodically writes sorted views to files.
@@ -47,6 +59,13 @@ class ResultAggregator:
         self.last_full_sorted = last_full_sorted
         self._pending_channels: Set[Tuple[str, str]] = set()
         self._finished_channels: Set[Tuple[str, str]] = set()
+        self._incremental = not config.speed_test_filter_host
+        self._sequence = count()
+        self._sorted_results: Dict[Tuple[str, str], list] = defaultdict(list)
+        self._tested_urls: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self._untested_results: Dict[Tuple[str, str], list] = {}
+        self._retain_results: Dict[Tuple[str, str], list] = {}
+        self._result_buckets: Dict[Tuple[str, str], Set[Tuple[Any, Any]]] = defaultdict(set)
 
     def _ensure_debounce_task_in_loop(self, loop: asyncio.AbstractEventLoop) -> None:
         """
@@ -73,6 +92,8 @@ class ResultAggregator:
         Add a test result item for a specific category and name.
         """
         self.test_results[cate][name].append(item)
+        if self._incremental:
+            self._insert_sorted_result(cate, name, item)
         self._dirty = True
         self._dirty_count += 1
         self.is_last = is_last
@@ -112,14 +133,122 @@ class ResultAggregator:
         if self._dirty_count >= self._min_items_before_flush:
             self._dirty_count = 0
 
+    def _normalize_result(self, item: Mapping) -> Mapping:
+        """
+        Get the result as sorted, the IPv6 results are reset without IPv6 support
+        """
+        if not self.ipv6_support and item.get("ipv_type") == "ipv6":
+            item = copy(item)
+            item.update(default_ipv6_result)
+        return item
+
+    def _insert_sorted_result(self, cate: str, name: str, item: Mapping) -> None:
+        """
+        Insert the valid test result into the speed ordered results of the channel, in O(log n) comparisons
+        """
+        url = item.get("url")
+        if url:
+            self._tested_urls[(cate, name)].add(url)
+        item = self._normalize_result(item)
+        if check_result_valid(item):
+            insort(self._sorted_results[(cate, name)], (get_speed_key(item), next(self._sequence), item))
+            self._result_buckets[(cate, name)].add((item.get("origin"), item.get("ipv_type")))
+
+    def _get_untested_results(self, cate: str, name: str) -> Iterator[Mapping]:
+        """
+        Get the valid results of the last view not tested yet, ordered by speed.
+        They are taken from the view on the first flush of the channel, the tested ones are skipped lazily
+        """
+        key = (cate, name)
+        untested = self._untested_results.get(key)
+        if untested is None:
+            prev_sorted = (self.last_full_sorted or {}).get(cate, {}).get(name, [])
+            untested = []
+            seen = set()
+            for item in prev_sorted:
+                url = item.get("url") if isinstance(item, Mapping) else None
+                if url and url not in seen and item.get("origin") not in retain_origin:
+                    seen.add(url)
+                    item = self._normalize_result(item)
+                    if check_result_valid(item):
+                        untested.append(item)
+                        self._result_buckets[key].add((item.get("origin"), item.get("ipv_type")))
+            untested.sort(key=get_speed_key)
+            self._untested_results[key] = untested
+        tested_urls = self._tested_urls.get(key)
+        if not tested_urls:
+            yield from untested
+            return
+        skipped = 0
+        for item in untested:
+            if item.get("url") in tested_urls:
+                skipped += 1
+            else:
+                yield item
+        if skipped > len(untested) // 2:
+            self._untested_results[key] = [item for item in untested if item.get("url") not in tested_urls]
+
+    def _get_channel_view(self, cate: str, name: str, finished: bool) -> list:
+        """
+        Get the sorted view of the channel: the retained base entries, then the valid results by speed,
+        with at most urls_limit results of each origin and IPv type, which covers what the writer can pick
+        """
+        key = (cate, name)
+        retain = self._retain_results.get(key)
+        if retain is None:
+            retain = self._retain_results[key] = [
+                value for value in self.base_data[cate][name]
+                if value["origin"] in retain_origin or (not self.ipv6_support and value["ipv_type"] == "ipv6")
+            ]
+        tested = (item for _, _, item in self._sorted_results.get(key, []))
+        results = tested if finished else heapq.merge(
+            tested, self._get_untested_results(cate, name), key=get_speed_key
+        )
+        urls_limit = config.urls_limit
+        buckets = self._result_buckets[key]
+        bucket_count = defaultdict(int)
+        full_count = 0
+        view = list(retain)
+        for item in results:
+            if full_count >= len(buckets):
+                break
+            bucket = (item.get("origin"), item.get("ipv_type"))
+            if bucket_count[bucket] < urls_limit:
+                bucket_count[bucket] += 1
+                view.append(item)
+                if bucket_count[bucket] == urls_limit:
+                    full_count += 1
+        return view
+
+    def _get_incremental_sorted(
+            self,
+            affected: Optional[Set[Tuple[str, str]]],
+            finished: Set[Tuple[str, str]],
+    ) -> Dict[str, Dict[str, list]]:
+        """
+        Get the sorted views of the affected channels from the ordered results, all the channels if not affected
+        """
+        if affected is None:
+            channels = [(cate, name, True) for cate, names in self.base_data.items() for name in names]
+        else:
+            channels = [
+                (cate, name, (cate, name) in finished)
+                for cate, name in affected if name in self.base_data.get(cate, {})
+            ]
+        new_sorted = defaultdict(dict)
+        for cate, name, is_finished in channels:
+            new_sorted[cate][name] = self._get_channel_view(cate, name, is_finished)
+        return new_sorted
+
     async def _atomic_write_sorted_view(
             self,
-            test_copy: Dict[str, Dict[str, list]],
+            test_copy: Optional[Dict[str, Dict[str, list]]],
             affected: Optional[Set[Tuple[str, str]]] = None,
             finished: Optional[Set[Tuple[str, str]]] = None,
     ) -> None:
         """
         Atomic write of sorted view to file, either partially or fully.
+        The views are read from the ordered results if no test copy is given.
         """
         if finished is None:
             finished = set()
@@ -133,7 +262,12 @@ class ResultAggregator:
             except Exception:
                 self.last_full_sorted = defaultdict(lambda: defaultdict(list))
 
-        if affected:
+        if test_copy is None:
+            try:
+                new_sorted = self._get_incremental_sorted(affected, finished)
+            except Exception:
+                new_sorted = defaultdict(lambda: defaultdict(list))
+        elif affected:
             partial_base = defaultdict(lambda: defaultdict(list))
             partial_result = defaultdict(lambda: defaultdict(list))
 
@@ -148,7 +282,7 @@ class ResultAggregator:
                     prev_sorted = self.last_full_sorted.get(cate, {}).get(name, [])
                     seen = {it.get("url") for it in partial_result[cate][name] if it.get("url")}
                     for item in prev_sorted:
-                        url = item.get("url") if isinstance(item, dict) else None
+                        url = item.get("url") if isinstance(item, Mapping) else None
                         if url and url not in seen and item.get("origin") not in retain_origin:
                             partial_result[cate][name].append(item)
                             seen.add(url)
@@ -170,7 +304,7 @@ class ResultAggregator:
 
         merged = defaultdict(lambda: defaultdict(list))
         for cate, names in (self.last_full_sorted or {}).items():
-            merged[cate].update({k: list(v) for k, v in names.items()})
+            merged[cate].update(names)
         for cate, names in new_sorted.items():
             for name, vals in names.items():
                 if vals:
@@ -185,6 +319,7 @@ class ResultAggregator:
             self.first_channel_name,
             True,
             self.is_last,
+            affected,
         )
 
         self.last_full_sorted = merged
@@ -215,9 +350,20 @@ class ResultAggregator:
         async with self._lock:
             if not self._dirty and not force:
                 return
-            test_copy = copy.deepcopy(self.test_results)
             pending = set(self._pending_channels)
             self._pending_channels.clear()
+            # The result lists are append-only and the results are not mutated, so copying the lists is a snapshot
+            if self._incremental and self.test_results:
+                test_copy = None
+            elif force or not pending:
+                test_copy = {
+                    cate: {name: list(items) for name, items in names.items()}
+                    for cate, names in self.test_results.items()
+                }
+            else:
+                test_copy = defaultdict(dict)
+                for cate, name in pending:
+                    test_copy[cate][name] = list(self.test_results[cate][name])
 
             if force:
                 finished_for_flush = set(self._finished_channels)
@@ -1,15 +1,26 @@
 import os
 import re
+import threading
+from collections import OrderedDict
+from typing import Iterable
 
 import utils.constants as constants
 from utils.tools import get_real_path, resource_path, format_name
 
+backref_pattern = re.compile(r"\\[1-9]|\\g<\d")
+
 
 class Alias:
+    cache_size = 65536
+
     def __init__(self):
         self.primary_to_aliases: dict[str, set[str]] = {}
         self.alias_to_primary: dict[str, str] = {}
         self.pattern_to_primary: list[tuple[re.Pattern, str]] = []
+        self._combined_pattern: re.Pattern | None = None
+        self._combined_dirty = True
+        self._primary_cache: OrderedDict[str, str] = OrderedDict()
+        self._primary_cache_lock = threading.Lock()
 
         real_path = get_real_path(resource_path(constants.alias_path))
         if os.path.exists(real_path):
@@ -24,15 +35,42 @@ class Alias:
                         for alias in aliases:
                             self.alias_to_primary[alias] = primary
                             if alias.startswith("re:"):
-                                raw_pattern = alias[3:]
-                                try:
-                                    pattern = re.compile(raw_pattern)
-                                    if (pattern, primary) not in self.pattern_to_primary:
-                                        self.pattern_to_primary.append((pattern, primary))
-                                except re.error:
-                                    pass
+                                self._add_pattern(alias[3:], primary)
                         self.alias_to_primary[primary] = primary
 
+    def _add_pattern(self, raw_pattern: str, primary: str):
+        """
+        Compile the alias pattern and add it to the pattern list
+        """
+        try:
+            pattern = re.compile(raw_pattern)
+            if (pattern, primary) not in self.pattern_to_primary:
+                self.pattern_to_primary.append((pattern, primary))
+                self._combined_dirty = True
+        except re.error:
+            pass
+
+    def _get_combined_pattern(self) -> re.Pattern | None:
+        """
+        Get all the patterns combined into one alternation with a named group for each,
+        None if the patterns can not be combined, e.g. with backreferences or global flags
+        """
+        if not self._combined_dirty:
+            return self._combined_pattern
+        self._combined_dirty = False
+        self._combined_pattern = None
+        if not self.pattern_to_primary or any(
+                backref_pattern.search(pattern.pattern) for pattern, _ in self.pattern_to_primary
+        ):
+            return None
+        try:
+            self._combined_pattern = re.compile("|".join(
+                f"(?P<_alias_{index}>{pattern.pattern})" for index, (pattern, _) in enumerate(self.pattern_to_primary)
+            ))
+        except re.error:
+            pass
+        return self._combined_pattern
+
     def get(self, name: str):
         """
         Get the alias by name
@@ -41,23 +79,56 @@ class Alias:
 
     def get_primary(self, name: str):
         """
-        Get the primary name by alias
+        Get the primary name by alias, memoized with a bounded LRU cache
         """
+        cache = self._primary_cache
+        with self._primary_cache_lock:
+            primary_name = cache.get(name)
+            if primary_name is not None:
+                cache.move_to_end(name)
+                return primary_name
         primary_name = self.alias_to_primary.get(name, None) or self.get_primary_by_pattern(name)
         if primary_name is None:
             alias_format_name = format_name(name)
             primary_name = self.alias_to_primary.get(alias_format_name, name)
+        with self._primary_cache_lock:
+            cache[name] = primary_name
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
         return primary_name
 
     def get_primary_by_pattern(self, name: str):
         """
         Get the primary name by pattern match
         """
-        for pattern, primary in self.pattern_to_primary:
+        combined_pattern = self._get_combined_pattern()
+        if combined_pattern is None:
+            patterns = self.pattern_to_primary
+        else:
+            match = combined_pattern.search(name)
+            if match is None:
+                return None
+            index = int(match.lastgroup.rpartition("_")[2])
+            # The leftmost match may come from a later pattern, only the patterns before it can precede it
+            patterns = self.pattern_to_primary[:index + 1]
+        for pattern, primary in patterns:
             if pattern.search(name):
                 return primary
         return None
 
+    def index_local(self, names: Iterable[str]) -> dict[str, list[str]]:
+        """
+        Index the local names matched from the start by the alias patterns, by primary name
+        """
+        index: dict[str, list[str]] = {}
+        for name in names:
+            for pattern, primary in self.pattern_to_primary:
+                if pattern.match(name):
+                    matched = index.setdefault(primary, [])
+                    if not matched or matched[-1] != name:
+                        matched.append(name)
+        return index
+
     def set(self, name: str, aliases: set[str]):
         """
         Set the aliases by name
@@ -65,15 +136,13 @@ class Alias:
         if name in self.primary_to_aliases:
             for alias in self.primary_to_aliases[name]:
                 self.alias_to_primary.pop(alias, None)
+            self.pattern_to_primary = [item for item in self.pattern_to_primary if item[1] != name]
+            self._combined_dirty = True
         self.primary_to_aliases[name] = set(aliases)
         for alias in aliases:
             self.alias_to_primary[alias] = name
             if alias.startswith("re:"):
-                raw_pattern = alias[3:]
-                try:
-                    pattern = re.compile(raw_pattern)
-                    if (pattern, name) not in self.pattern_to_primary:
-                        self.pattern_to_primary.append((pattern, name))
-                except re.error:
-                    pass
+                self._add_pattern(alias[3:], name)
         self.alias_to_primary[name] = name
+        with self._primary_cache_lock:
+            self._primary_cache.clear()
@@ -2,31 +2,41 @@ import asyncio
 import gzip
 import json
 import math
+import multiprocessing
 import os
 import pickle
-import re
 import tempfile
 from collections import defaultdict
 from logging import INFO
+from queue import Empty
+from time import time
 
 import utils.constants as constants
+import utils.speed_store as speed_store
 from utils.alias import Alias
 from utils.config import config
 from utils.db import get_db_connection, return_db_connection
 from utils.frozen import is_url_frozen, mark_url_bad, mark_url_good
 from utils.i18n import t
 from utils.ip_checker import IPChecker
+from utils.limiter import HostLimiter
+from utils.record import ChannelRecord, get_record_resolution_value
+from utils.requests.pool import ConnectionPool
 from utils.speed import (
     get_speed,
     get_speed_result,
+    get_cache as get_speed_cache,
+    merge_cache as merge_speed_cache,
+    get_sweep_delay,
     get_sort_result,
-    check_ffmpeg_installed_status
+    check_result_valid
 )
 from utils.tools import (
     format_name,
     get_name_value,
     check_url_by_keywords,
-    get_total_urls,
+    classify_total_urls,
+    select_total_urls,
     add_url_info,
     resource_path,
     get_name_urls_from_file,
@@ -34,17 +44,17 @@ from utils.tools import (
     get_datetime_now,
     get_url_host,
     check_ipv_type_match,
-    convert_to_m3u,
+    write_m3u,
     custom_print,
     get_name_uri_from_dir,
     get_resolution_value,
     get_public_url, build_path_list, get_real_path
 )
-from utils.types import ChannelData, OriginType, CategoryChannelData, WhitelistMaps
+from utils.types import OriginType, CategoryChannelData, WhitelistMaps
 from utils.whitelist import is_url_whitelisted, get_whitelist_url, get_whitelist_total_count
 
 channel_alias = Alias()
-ip_checker = IPChecker()
+ip_checker = IPChecker(cache_path=constants.host_cache_path, cache_ttl=config.host_cache_ttl * 3600)
 location_list = config.location
 isp_list = config.isp
 min_resolution_value = config.min_resolution_value
@@ -52,9 +62,10 @@ open_history = config.open_history
 open_local = config.open_local
 open_rtmp = config.open_rtmp
 retain_origin = ["whitelist", "hls"]
+write_fragment_cache: dict[str, dict] = {}
 
 
-def format_channel_data(url: str, origin: OriginType) -> ChannelData:
+def format_channel_data(url: str, origin: OriginType) -> ChannelRecord:
     """
     Format the channel data
     """
@@ -64,14 +75,14 @@ def format_channel_data(url: str, origin: OriginType) -> ChannelData:
     if info and info.startswith("!"):
         origin = "whitelist"
         info = info[1:]
-    return {
-        "id": hash(url),
-        "url": url,
-        "host": get_url_host(url),
-        "origin": origin,
-        "ipv_type": None,
-        "extra_info": info
-    }
+    return ChannelRecord(
+        id=hash(url),
+        url=url,
+        host=get_url_host(url),
+        origin=origin,
+        ipv_type=None,
+        extra_info=info
+    )
 
 
 def check_channel_need_frozen(info) -> bool:
@@ -82,17 +93,30 @@ def check_channel_need_frozen(info) -> bool:
     if delay == -1 or info.get("speed", 0) == 0:
         return True
     if info.get("resolution"):
-        if get_resolution_value(info["resolution"]) < min_resolution_value:
+        if get_record_resolution_value(info) < min_resolution_value:
             return True
     return False
 
 
+def mark_result_frozen(info) -> None:
+    """
+    Mark the url of the test result as bad or good, skip the results without a speed test
+    """
+    if info.get("speed") is None:
+        return
+    if check_channel_need_frozen(info):
+        mark_url_bad(info.get("url"))
+    else:
+        mark_url_good(info.get("url"))
+
+
 def get_channel_data_from_file(channels, file, whitelist_maps, blacklist,
                                local_data=None, hls_data=None) -> CategoryChannelData:
     """
     Get the channel data from the file
     """
     current_category = ""
+    local_alias_index = None
 
     for line in file:
         line = line.strip()
@@ -126,30 +150,19 @@ def get_channel_data_from_file(channels, file, whitelist_maps, blacklist,
                                 existing_urls.add(formatted["url"])
 
                     if open_local and local_data:
-                        alias_names = channel_alias.get(name)
+                        if local_alias_index is None:
+                            local_alias_index = channel_alias.index_local(local_data)
+                        alias_names = set(channel_alias.get(name))
                         alias_names.update([name, format_name(name)])
-                        for alias_name in alias_names:
-                            if alias_name in local_data:
-                                for local_url in local_data[alias_name]:
-                                    if not check_url_by_keywords(local_url, blacklist):
-                                        formatted = format_channel_data(local_url, "local")
-                                        if formatted["url"] not in existing_urls:
-                                            category_dict[name].append(formatted)
-                                            existing_urls.add(formatted["url"])
-                            elif alias_name.startswith("re:"):
-                                raw_pattern = alias_name[3:]
-                                try:
-                                    pattern = re.compile(raw_pattern)
-                                    for local_name in local_data:
-                                        if re.match(pattern, local_name):
-                                            for local_url in local_data[local_name]:
-                                                if not check_url_by_keywords(local_url, blacklist):
-                                                    formatted = format_channel_data(local_url, "local")
-                                                    if formatted["url"] not in existing_urls:
-                                                        category_dict[name].append(formatted)
-                                                        existing_urls.add(formatted["url"])
-                                except re.error:
-                                    pass
+                        local_names = [alias_name for alias_name in alias_names if alias_name in local_data]
+                        local_names.extend(local_alias_index.get(name, []))
+                        for local_name in local_names:
+                            for local_url in local_data[local_name]:
+                                if not check_url_by_keywords(local_url, blacklist):
+                                    formatted = format_channel_data(local_url, "local")
+                                    if formatted["url"] not in existing_urls:
+                                        category_dict[name].append(formatted)
+                                        existing_urls.add(formatted["url"])
                 if url:
                     if is_url_whitelisted(whitelist_maps, url, name):
                         formatted = format_channel_data(url, "whitelist")
@@ -355,22 +368,22 @@ def append_data_to_info_data(
 
                 if isp and isp_list and not any(item in isp for item in isp_list):
                     continue
-            channel_list.append({
-                "id": channel_id,
-                "url": url,
-                "host": host,
-                "date": date,
-                "delay": delay,
-                "speed": speed,
-                "resolution": resolution,
-                "origin": url_origin,
-                "ipv_type": ipv_type,
-                "location": location,
-                "isp": isp,
-                "headers": headers,
-                "catchup": catchup,
-                "extra_info": extra_info
-            })
+            channel_list.append(ChannelRecord(
+                id=channel_id,
+                url=url,
+                host=host,
+                date=date,
+                delay=delay,
+                speed=speed,
+                resolution=resolution,
+                origin=url_origin,
+                ipv_type=ipv_type,
+                location=location,
+                isp=isp,
+                headers=headers,
+                catchup=catchup,
+                extra_info=extra_info
+            ))
             existing_urls.add(url)
 
         except Exception as e:
@@ -425,6 +438,22 @@ def print_channel_number(data: CategoryChannelData, cate: str, name: str):
     )
 
 
+async def resolve_channel_hosts(items, subscribe_result=None) -> int:
+    """
+    Resolve the hosts of the channel and subscribe data concurrently before merging
+    """
+    urls = []
+    for _, channel_obj in items:
+        for name, info_list in channel_obj.items():
+            urls.extend(
+                info["url"] for info in info_list if info.get("url") and info.get("origin") not in retain_origin
+            )
+            if subscribe_result and config.open_subscribe:
+                urls.extend(info["url"] for info in get_channel_results_by_name(name, subscribe_result) if
+                            info.get("url"))
+    return await ip_checker.resolve_hosts(urls, limit=config.dns_resolve_limit, timeout=config.request_timeout)
+
+
 def append_total_data(
         items,
         data,
@@ -463,26 +492,163 @@ def append_total_data(
             print_channel_number(data, cate, name)
 
 
-async def test_speed(data, ipv6=False, callback=None, on_task_complete=None):
+def _get_worker_messages(queue, timeout=1, limit=1000) -> list:
+    """
+    Get the pending messages of the worker queue, wait for the first one up to the timeout
+    """
+    messages = []
+    try:
+        messages.append(queue.get(timeout=timeout))
+        while len(messages) < limit:
+            messages.append(queue.get_nowait())
+    except Empty:
+        pass
+    return messages
+
+
+def _test_speed_worker(data, ipv6, limit, host_limit, store_entries, queue):
+    """
+    Run the speed test of the shard in a worker process, stream the results back through the queue
+    """
+    config.set("Settings", "speed_test_limit", str(limit))
+    config.set("Settings", "speed_test_host_limit", str(host_limit))
+    speed_store.merge(store_entries)
+    try:
+        asyncio.run(test_speed(
+            data,
+            ipv6=ipv6,
+            callback=lambda: queue.put(("progress",)),
+            on_task_complete=lambda cate, name, item, is_channel_last, _: queue.put(
+                ("result", cate, name, item, is_channel_last)
+            ),
+            worker=True,
+        ))
+    finally:
+        queue.put(("done", get_speed_cache(), speed_store.export()))
+
+
+def _split_limit(limit: int, parts: int) -> list[int]:
+    """
+    Split the concurrency limit across the workers, the remainder goes to the first ones,
+    each worker gets at least 1 unless the limit is off (0)
+    """
+    if limit <= 0:
+        return [0] * parts
+    return [max(1, limit // parts + (1 if index < limit % parts else 0)) for index in range(parts)]
+
+
+async def _test_speed_sharded(data, ipv6=False, workers=2, callback=None, on_task_complete=None):
+    """
+    Shard the channels across worker processes, merge the results streamed back in this process
+    """
+    channels = sorted(
+        ((cate, name, info_list) for cate, channel_obj in data.items() for name, info_list in channel_obj.items()
+         if info_list),
+        key=lambda item: len(item[2]),
+        reverse=True,
+    )
+    shards = [defaultdict(dict) for _ in range(min(workers, len(channels)))]
+    loads = [0] * len(shards)
+    for cate, name, info_list in channels:
+        index = loads.index(min(loads))
+        shards[index][cate][name] = info_list
+        loads[index] += len(info_list)
+    grouped_results = {}
+    if not shards:
+        return grouped_results
+
+    get_logger(constants.speed_test_log_path, level=INFO, init=True).handlers.clear()
+    limits = _split_limit(config.speed_test_limit, len(shards))
+    host_limits = _split_limit(config.speed_test_host_limit, len(shards))
+    store_entries = speed_store.export()
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    processes = [
+        context.Process(
+            target=_test_speed_worker,
+            args=(dict(shard), ipv6, limit, host_limit, store_entries, queue),
+            daemon=True,
+        )
+        for shard, limit, host_limit in zip(shards, limits, host_limits)
+    ]
+    for process in processes:
+        process.start()
+
+    loop = asyncio.get_running_loop()
+    finished_channels = 0
+    done = 0
+    try:
+        while done < len(processes):
+            messages = await loop.run_in_executor(None, _get_worker_messages, queue)
+            if not messages and not any(process.is_alive() for process in processes):
+                break
+            for message in messages:
+                if message[0] == "progress":
+                    if callback:
+                        callback()
+                elif message[0] == "result":
+                    _, cate, name, item, is_channel_last = message
+                    item = ChannelRecord(item)
+                    grouped_results.setdefault(cate, {}).setdefault(name, []).append(item)
+                    mark_result_frozen(item)
+                    if is_channel_last:
+                        finished_channels += 1
+                    if on_task_complete:
+                        try:
+                            on_task_complete(cate, name, item, is_channel_last, finished_channels >= len(channels))
+                        except Exception:
+                            pass
+                elif message[0] == "done":
+                    merge_speed_cache(message[1])
+                    speed_store.merge(message[2])
+                    done += 1
+        for process in processes:
+            await loop.run_in_executor(None, process.join)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    return grouped_results
+
+
+async def test_speed(data, ipv6=False, callback=None, on_task_complete=None, worker=False):
     """
     Test speed of channel data
     """
+    workers = config.speed_test_workers
+    if workers > 1 and not worker:
+        return await _test_speed_sharded(data, ipv6, workers, callback, on_task_complete)
     ipv6_proxy_url = None if (not config.open_ipv6 or ipv6) else constants.ipv6_proxy
     open_headers = config.open_headers
-    get_resolution = config.open_filter_resolution and check_ffmpeg_installed_status()
-    semaphore = asyncio.Semaphore(config.speed_test_limit)
-    logger = get_logger(constants.speed_test_log_path, level=INFO, init=True)
-
-    async def limited_get_speed(channel_info):
-        async with semaphore:
+    # The resolution is sniffed from the stream head without ffmpeg, only the ffprobe fallback needs it
+    get_resolution = config.open_filter_resolution
+    limiter = HostLimiter(config.speed_test_limit, config.speed_test_host_limit)
+    logger = get_logger(constants.speed_test_log_path, level=INFO, init=not worker)
+    pool = ConnectionPool()
+    session = await pool.open()
+
+    async def limited_get_speed(channel_info, name):
+        async with limiter.slot(channel_info.get("host")):
             headers = (open_headers and channel_info.get("headers")) or None
             return await get_speed(
                 channel_info,
+                name=name,
                 headers=headers,
                 ipv6_proxy=ipv6_proxy_url,
                 filter_resolution=get_resolution,
                 logger=logger,
                 callback=callback,
+                session=session,
+            )
+
+    async def limited_get_sweep_delay(channel_info):
+        async with limiter.slot(channel_info.get("host")):
+            headers = (open_headers and channel_info.get("headers")) or None
+            return await get_sweep_delay(
+                channel_info,
+                headers=headers,
+                ipv6_proxy=ipv6_proxy_url,
+                session=session,
             )
 
     total_tasks = sum(len(info_list) for channel_obj in data.values() for info_list in channel_obj.values())
@@ -495,32 +661,42 @@ async def test_speed(data, ipv6=False, callback=None, on_task_complete=None):
     channel_map = {}
     grouped_results = {}
     completed_by_channel = defaultdict(int)
-
-    def _on_task_done(task):
+    open_early_stop = config.open_speed_test_early_stop
+    urls_limit = config.urls_limit
+    tasks_by_channel = defaultdict(list)
+    valid_by_channel = defaultdict(int)
+    stopped_tasks = set()
+
+    def _stop_channel(cate, name):
+        """
+        Cancel the pending tasks of the channel, the channel is finished with the results so far
+        """
+        nonlocal total_tasks
+        pending = [task for task in tasks_by_channel.pop((cate, name), []) if not task.done()]
+        for task in pending:
+            stopped_tasks.add(task)
+            task.cancel()
+        total_tasks -= len(pending)
+        total_tasks_by_channel[(cate, name)] -= len(pending)
+
+    def _report(cate, name, info, result):
         nonlocal completed
-        try:
-            result = task.result()
-        except Exception:
-            result = {}
-        meta = channel_map.get(task)
-        if not meta:
-            return
-        cate, name, info = meta
         if cate not in grouped_results:
             grouped_results[cate] = {}
         if name not in grouped_results[cate]:
             grouped_results[cate][name] = []
-        merged = {**info, **result}
+        merged = ChannelRecord(info, name=name, **result)
         grouped_results[cate][name].append(merged)
-
-        if check_channel_need_frozen(merged):
-            mark_url_bad(merged.get("url"))
-        else:
-            mark_url_good(merged.get("url"))
+        mark_result_frozen(merged)
 
         completed += 1
         completed_by_channel[(cate, name)] += 1
 
+        if open_early_stop and merged.get("speed") is not None and check_result_valid(merged):
+            valid_by_channel[(cate, name)] += 1
+            if valid_by_channel[(cate, name)] == urls_limit:
+                _stop_channel(cate, name)
+
         is_channel_last = completed_by_channel[(cate, name)] >= total_tasks_by_channel.get((cate, name), 0)
         is_last = completed >= total_tasks
 
@@ -530,18 +706,102 @@ async def test_speed(data, ipv6=False, callback=None, on_task_complete=None):
             except Exception:
                 pass
 
-    for cate, channel_obj in data.items():
-        for name, info_list in channel_obj.items():
-            for info in info_list:
-                info['name'] = name
-                task = asyncio.create_task(limited_get_speed(info))
-                channel_map[task] = (cate, name, info)
-                task.add_done_callback(_on_task_done)
-                tasks.append(task)
-
-    if tasks:
-        await asyncio.gather(*tasks, return_exceptions=True)
+    def _on_task_done(task):
+        if task in stopped_tasks:
+            if task.cancelled() and callback:
+                callback()
+            return
+        try:
+            result = task.result()
+        except Exception:
+            result = {}
+        meta = channel_map.get(task)
+        if not meta:
+            return
+        cate, name, info = meta
+        _report(cate, name, info, result)
+
+    async def _sweep():
+        """
+        Keep the best candidates of the channels by the sweep delay, report the others directly
+        """
+        sweep_size = max(1, math.ceil(config.urls_limit * config.speed_test_sweep_margin))
+        sweep_items = [
+            (cate, name, info)
+            for cate, channel_obj in data.items()
+            for name, info_list in channel_obj.items()
+            if len(info_list) > sweep_size
+            for info in info_list
+        ]
+        if not sweep_items:
+            return data
+        start_time = time()
+        delays = await asyncio.gather(
+            *(limited_get_sweep_delay(info) for _, _, info in sweep_items), return_exceptions=True
+        )
+        swept = defaultdict(list)
+        for (cate, name, info), delay in zip(sweep_items, delays):
+            swept[(cate, name)].append((delay if isinstance(delay, int) else -1, info))
+        candidates_total = 0
+        test_data = defaultdict(dict)
+        for cate, channel_obj in data.items():
+            for name, info_list in channel_obj.items():
+                if (cate, name) not in swept:
+                    test_data[cate][name] = info_list
+                    candidates_total += len(info_list)
+                    continue
+                ranked = sorted((item for item in swept[(cate, name)] if item[0] != -1), key=lambda item: item[0])
+                candidates = ranked[:sweep_size]
+                test_data[cate][name] = [info for _, info in candidates]
+                candidates_total += len(candidates)
+                candidate_ids = {id(info) for _, info in candidates}
+                for delay, info in swept[(cate, name)]:
+                    if id(info) in candidate_ids:
+                        continue
+                    _report(cate, name, info, {
+                        'speed': 0 if delay == -1 else None,
+                        'delay': delay,
+                        'resolution': info.get('resolution')
+                    })
+                    if callback:
+                        callback()
+        logger.info(
+            f"Sweep: Total: {len(sweep_items)}, Candidates: {candidates_total}/{total_tasks}, "
+            f"Time: {time() - start_time:.2f} s"
+        )
+        return test_data
 
+    try:
+        test_data = await _sweep() if config.open_speed_test_sweep else data
+        for cate, channel_obj in test_data.items():
+            for name, info_list in channel_obj.items():
+                for info in info_list:
+                    task = asyncio.create_task(limited_get_speed(info, name))
+                    channel_map[task] = (cate, name, info)
+                    task.add_done_callback(_on_task_done)
+                    tasks.append(task)
+                    if open_early_stop:
+                        tasks_by_channel[(cate, name)].append(task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await pool.close()
+
+    for host, host_stats in limiter.stats.items():
+        logger.info(
+            f"Host: {host}, Total: {host_stats['total']}, Max Queue: {host_stats['max_queue']}, "
+            f"Avg Wait: {host_stats['wait'] / host_stats['total'] * 1000:.0f} ms, Max Wait: {host_stats['max_wait'] * 1000:.0f} ms"
+        )
+    if stopped_tasks:
+        logger.info(
+            f"Early Stop: Channels: {sum(1 for count in valid_by_channel.values() if count >= urls_limit)}, "
+            f"Cancelled: {len(stopped_tasks)}"
+        )
+    pool_stats = pool.get_stats()
+    logger.info(
+        f"Connection Pool: Hit: {pool_stats['hit']}, Miss: {pool_stats['miss']}, Hit Rate: {pool_stats['hit_rate']:.2f}%, "
+        f"DNS Hit: {pool_stats['dns_hit']}, DNS Miss: {pool_stats['dns_miss']}, DNS Hit Rate: {pool_stats['dns_hit_rate']:.2f}%"
+    )
     logger.handlers.clear()
     return grouped_results
 
@@ -597,102 +857,54 @@ def generate_channel_statistic(logger, cate, name, values):
         f"\n{f"{t("name.category")}: {cate}, {t("name.name")}: {name}, {t("name.total")}: {total}, {t("name.valid")}: {valid}, {t("name.valid_percent")}: {valid_rate:.2f}%, {t("name.whitelist")}: {whitelist_count}, IPv4: {ipv4_count}, IPv6: {ipv6_count}, {t("name.min_delay")}: {min_delay} ms, {t("name.max_speed")}: {max_speed:.2f} M/s, {t("name.average_speed")}: {avg_speed:.2f} M/s, {t("name.max_resolution")}: {max_resolution}"}")
 
 
-def process_write_content(
-        path: str,
-        data: CategoryChannelData,
-        hls_url: str = None,
-        open_empty_category: bool = False,
-        ipv_type_prefer: list[str] = None,
-        origin_type_prefer: list[str] = None,
-        first_channel_name: str = None,
-        enable_log: bool = False,
-        is_last: bool = False,
-):
+def render_channel_fragment(name: str, channel_urls: list, hls_url: str = None, open_url_info: bool = False):
     """
-    Get channel write content
-    :param path: write into path
-    :param data: channel data
-    :param hls_url: hls url
-    :param open_empty_category: show empty category
-    :param ipv_type_prefer: ipv type prefer
-    :param origin_type_prefer: origin type prefer
-    :param first_channel_name: the first channel name
-    :param enable_log: enable log
-    :param is_last: is last write
+    Render the result lines of the channel urls
+    :return: The lines, and the written link of each url
     """
-    content = ""
-    no_result_name = []
-    first_cate = True
-    result_data = defaultdict(list)
-    custom_print.disable = not enable_log
-    rtmp_type = ["hls"] if hls_url else []
-    open_url_info = config.open_url_info
-    for cate, channel_obj in data.items():
-        content += f"{'\n\n' if not first_cate else ''}{cate},#genre#"
-        first_cate = False
-        channel_obj_keys = channel_obj.keys()
-        for i, name in enumerate(channel_obj_keys):
-            info_list = data.get(cate, {}).get(name, [])
-            channel_urls = get_total_urls(info_list, ipv_type_prefer, origin_type_prefer, rtmp_type)
-            result_data[name].extend(channel_urls)
-            if not channel_urls:
-                if open_empty_category:
-                    no_result_name.append(name)
-                continue
-            for item in channel_urls:
-                item_url = item["url"]
-                if open_url_info and item["extra_info"]:
-                    item_url = add_url_info(item_url, item["extra_info"])
-                total_item_url = f"{hls_url}/{item['id']}.m3u8" if hls_url else item_url
-                content += f"\n{name},{total_item_url}"
-    if open_empty_category and no_result_name:
-        custom_print(f"\n{t("msg.no_result_channel")}")
-        content += f"\n\n{t("content.no_result_channel_genre")},#genre#"
-        for i, name in enumerate(no_result_name):
-            end_char = ", " if i < len(no_result_name) - 1 else ""
-            custom_print(name, end=end_char)
-            content += f"\n{name},url"
-    if config.open_update_time:
-        update_time_item = next(
-            (urls[0] for channel_obj in data.values()
-             for info_list in channel_obj.values()
-             if (urls := get_total_urls(info_list, ipv_type_prefer, origin_type_prefer, rtmp_type))),
-            {"id": "id", "url": "url"}
-        )
-        now = get_datetime_now()
-        update_time_item_url = update_time_item["url"]
-        update_title = t("content.update_time") if is_last else t("content.update_running")
-        if open_url_info and update_time_item["extra_info"]:
-            update_time_item_url = add_url_info(update_time_item_url, update_time_item["extra_info"])
-        value = f"{hls_url}/{update_time_item["id"]}.m3u8" if hls_url else update_time_item_url
-        if config.update_time_position == "top":
-            content = f"{update_title},#genre#\n{now},{value}\n\n{content}"
-        else:
-            content += f"\n\n{update_title},#genre#\n{now},{value}"
-    if hls_url:
-        db_dir = os.path.dirname(constants.rtmp_data_path)
-        if db_dir:
-            os.makedirs(db_dir, exist_ok=True)
+    lines = []
+    links = []
+    for item in channel_urls:
+        item_url = item["url"]
+        if open_url_info and item["extra_info"]:
+            item_url = add_url_info(item_url, item["extra_info"])
+        total_item_url = f"{hls_url}/{item['id']}.m3u8" if hls_url else item_url
+        lines.append(f"\n{name},{total_item_url}")
+        links.append(total_item_url)
+    return "".join(lines), links
+
+
+def write_rtmp_data(items) -> None:
+    """
+    Write the id, url and headers of the hls result items into the rtmp db
+    """
+    db_dir = os.path.dirname(constants.rtmp_data_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
 
+    try:
+        conn = get_db_connection(constants.rtmp_data_path)
+    except Exception as e:
+        print(t("msg.write_error").format(info=f"open rtmp db error: {e}"))
+    else:
         try:
-            conn = get_db_connection(constants.rtmp_data_path)
-        except Exception as e:
-            print(t("msg.write_error").format(info=f"open rtmp db error: {e}"))
-        else:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "CREATE TABLE IF NOT EXISTS result_data (id TEXT PRIMARY KEY, url TEXT, headers TEXT)"
-                )
-                for data_list in result_data.values():
-                    for item in data_list:
-                        cursor.execute(
-                            "INSERT OR REPLACE INTO result_data (id, url, headers) VALUES (?, ?, ?)",
-                            (item["id"], item["url"], json.dumps(item.get("headers", None)))
-                        )
-                conn.commit()
-            finally:
-                return_db_connection(constants.rtmp_data_path, conn)
+            cursor = conn.cursor()
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS result_data (id TEXT PRIMARY KEY, url TEXT, headers TEXT)"
+            )
+            cursor.executemany(
+                "INSERT OR REPLACE INTO result_data (id, url, headers) VALUES (?, ?, ?)",
+                [(item["id"], item["url"], json.dumps(item.get("headers", None))) for item in items]
+            )
+            conn.commit()
+        finally:
+            return_db_connection(constants.rtmp_data_path, conn)
+
+
+def write_result_content(path: str, content: str) -> bool:
+    """
+    Write the result content into the path atomically, return whether it is written
+    """
     try:
         target_dir = os.path.dirname(path) or "."
         os.makedirs(target_dir, exist_ok=True)
@@ -712,60 +924,159 @@ def process_write_content(
                 f.write(content)
         except Exception as e2:
             print(t("msg.write_error").format(info=e2))
-            return
+            return False
+    return True
+
+
+def process_write_content(
+        variant: dict,
+        first_channel_name: str = None,
+        open_empty_category: bool = False,
+        is_last: bool = False,
+):
+    """
+    Write the txt and m3u result of the output variant from its rendered fragments
+    :param variant: the output variant with the parts, entries and result data of the traversal
+    :param first_channel_name: the first channel name
+    :param open_empty_category: show empty category
+    :param is_last: is last write
+    """
+    path = variant["path"]
+    hls_url = variant["hls_url"]
+    parts = variant["parts"]
+    entries = variant["entries"]
+    no_result_name = variant["no_result_name"]
+    custom_print.disable = not variant["enable_log"]
+    if open_empty_category and no_result_name:
+        custom_print(f"\n{t("msg.no_result_channel")}")
+        no_result_genre = t("content.no_result_channel_genre")
+        parts.append(f"\n\n{no_result_genre},#genre#")
+        for i, name in enumerate(no_result_name):
+            end_char = ", " if i < len(no_result_name) - 1 else ""
+            custom_print(name, end=end_char)
+            parts.append(f"\n{name},url")
+            entries.append((no_result_genre, name, "url"))
+    content = "".join(parts)
+    if config.open_update_time:
+        update_time_item = variant["first_item"] or {"id": "id", "url": "url"}
+        now = get_datetime_now()
+        update_time_item_url = update_time_item["url"]
+        update_title = t("content.update_time") if is_last else t("content.update_running")
+        if config.open_url_info and update_time_item["extra_info"]:
+            update_time_item_url = add_url_info(update_time_item_url, update_time_item["extra_info"])
+        value = f"{hls_url}/{update_time_item["id"]}.m3u8" if hls_url else update_time_item_url
+        if config.update_time_position == "top":
+            content = f"{update_title},#genre#\n{now},{value}\n\n{content}"
+            entries.insert(0, (update_title, now, value))
+        else:
+            content += f"\n\n{update_title},#genre#\n{now},{value}"
+            entries.append((update_title, now, value))
+    if not write_result_content(path, content):
+        return
     try:
-        convert_to_m3u(path, first_channel_name, data=result_data)
+        write_m3u(os.path.splitext(path)[0] + ".m3u", entries, first_channel_name, data=variant["result_data"])
     except Exception:
         pass
 
 
-def write_channel_to_file(data, ipv6=False, first_channel_name=None, skip_print=False, is_last=False):
+def get_write_variants(ipv6=False) -> list[dict]:
     """
-    Write channel to file
+    Get the output variants of the result, with their path, hls url and ipv type prefer
+    """
+    ipv_type_prefer = list(config.ipv_type_prefer)
+    if any(pref == "auto" for pref in ipv_type_prefer):
+        ipv_type_prefer = ["ipv6", "ipv4"] if ipv6 else ["ipv4", "ipv6"]
+    hls_url = f"{get_public_url()}/hls"
+    file_list = [
+        {"path": config.final_file, "enable_log": True},
+        {"path": constants.ipv4_result_path, "ipv_type_prefer": ["ipv4"]},
+        {"path": constants.ipv6_result_path, "ipv_type_prefer": ["ipv6"]}
+    ]
+    if config.open_rtmp and not os.getenv("GITHUB_ACTIONS"):
+        file_list += [
+            {"path": constants.hls_result_path, "hls_url": hls_url},
+            {
+                "path": constants.hls_ipv4_result_path,
+                "hls_url": hls_url,
+                "ipv_type_prefer": ["ipv4"]
+            },
+            {
+                "path": constants.hls_ipv6_result_path,
+                "hls_url": hls_url,
+                "ipv_type_prefer": ["ipv6"]
+            },
+        ]
+    return [
+        {
+            "path": file["path"],
+            "hls_url": file.get("hls_url"),
+            "ipv_type_prefer": file.get("ipv_type_prefer", ipv_type_prefer),
+            "enable_log": file.get("enable_log", False),
+        }
+        for file in file_list
+    ]
+
+
+def clear_write_fragment_cache():
+    """
+    Clear the rendered channels of the last run, so their data is not kept alive between runs
+    """
+    write_fragment_cache.clear()
+
+
+def write_channel_to_file(data, ipv6=False, first_channel_name=None, skip_print=False, is_last=False, dirty=None):
+    """
+    Write channel to file, all the output variants are rendered in one traversal of the data.
+    The rendered channels are cached by path, and only re-rendered if they are in the dirty (category, name)
+    or their data changed
     """
     try:
         if not skip_print:
             print(t("msg.writing_result"))
         open_empty_category = config.open_empty_category
-        ipv_type_prefer = list(config.ipv_type_prefer)
-        if any(pref == "auto" for pref in ipv_type_prefer):
-            ipv_type_prefer = ["ipv6", "ipv4"] if ipv6 else ["ipv4", "ipv6"]
         origin_type_prefer = config.origin_type_prefer
-        hls_url = f"{get_public_url()}/hls"
-        file_list = [
-            {"path": config.final_file, "enable_log": True},
-            {"path": constants.ipv4_result_path, "ipv_type_prefer": ["ipv4"]},
-            {"path": constants.ipv6_result_path, "ipv_type_prefer": ["ipv6"]}
-        ]
-        if config.open_rtmp and not os.getenv("GITHUB_ACTIONS"):
-            file_list += [
-                {"path": constants.hls_result_path, "hls_url": hls_url},
-                {
-                    "path": constants.hls_ipv4_result_path,
-                    "hls_url": hls_url,
-                    "ipv_type_prefer": ["ipv4"]
-                },
-                {
-                    "path": constants.hls_ipv6_result_path,
-                    "hls_url": hls_url,
-                    "ipv_type_prefer": ["ipv6"]
-                },
-            ]
-        for file in file_list:
-            target_dir = os.path.dirname(file["path"])
-            if target_dir:
-                os.makedirs(target_dir, exist_ok=True)
-            process_write_content(
-                path=file["path"],
-                data=data,
-                hls_url=file.get("hls_url"),
-                open_empty_category=open_empty_category,
-                ipv_type_prefer=file.get("ipv_type_prefer", ipv_type_prefer),
-                origin_type_prefer=origin_type_prefer,
-                first_channel_name=first_channel_name,
-                enable_log=file.get("enable_log", False),
-                is_last=is_last
-            )
+        open_url_info = config.open_url_info
+        variants = get_write_variants(ipv6)
+        for variant in variants:
+            signature = (tuple(variant["ipv_type_prefer"] or ()), tuple(origin_type_prefer or ()), variant["hls_url"],
+                         open_url_info, config.urls_limit)
+            fragment_cache = write_fragment_cache.get(variant["path"])
+            if fragment_cache is None or fragment_cache["signature"] != signature:
+                fragment_cache = write_fragment_cache[variant["path"]] = {"signature": signature, "fragments": {}}
+            variant.update(fragments=fragment_cache["fragments"], parts=[], entries=[], no_result_name=[],
+                           first_item=None, result_data=defaultdict(list))
+        rtmp_items = {}
+        for cate, channel_obj in data.items():
+            for variant in variants:
+                variant["parts"].append(f"{'\n\n' if variant["parts"] else ''}{cate},#genre#")
+            for name, info_list in channel_obj.items():
+                classified = None
+                is_dirty = dirty is not None and (cate, name) in dirty
+                for variant in variants:
+                    fragments = variant["fragments"]
+                    fragment = fragments.get((cate, name))
+                    if fragment is None or is_dirty or fragment[0] is not info_list:
+                        if classified is None:
+                            classified = classify_total_urls(info_list)
+                        channel_urls = select_total_urls(classified, variant["ipv_type_prefer"], origin_type_prefer)
+                        text, links = render_channel_fragment(name, channel_urls, variant["hls_url"], open_url_info)
+                        fragment = fragments[(cate, name)] = (info_list, channel_urls, text, links)
+                        if variant["hls_url"]:
+                            rtmp_items.update((item["id"], item) for item in channel_urls)
+                    _, channel_urls, text, links = fragment
+                    variant["result_data"][name].extend(channel_urls)
+                    if not channel_urls:
+                        if open_empty_category:
+                            variant["no_result_name"].append(name)
+                        continue
+                    if variant["first_item"] is None:
+                        variant["first_item"] = channel_urls[0]
+                    variant["parts"].append(text)
+                    variant["entries"].extend((cate, name, link) for link in links)
+        if rtmp_items:
+            write_rtmp_data(rtmp_items.values())
+        for variant in variants:
+            process_write_content(variant, first_channel_name, open_empty_category, is_last)
         if not skip_print:
             print(t("msg.write_success"))
     except Exception as e:
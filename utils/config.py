@@ -189,6 +189,22 @@ class ConfigManager:
     def request_timeout(self):
         return self.config.getint("Settings", "request_timeout", fallback=10)
 
+    @property
+    def subscribe_request_limit(self):
+        return self.config.getint("Settings", "subscribe_request_limit", fallback=10)
+
+    @property
+    def open_subscribe_cache(self):
+        return self.config.getboolean("Settings", "open_subscribe_cache", fallback=True)
+
+    @property
+    def subscribe_min_yield(self):
+        return self.config.getfloat("Settings", "subscribe_min_yield", fallback=0)
+
+    @property
+    def subscribe_low_yield_interval(self):
+        return self.config.getint("Settings", "subscribe_low_yield_interval", fallback=3)
+
     @property
     def speed_test_timeout(self):
         return self.config.getint("Settings", "speed_test_timeout", fallback=10)
@@ -233,6 +249,66 @@ class ConfigManager:
     def speed_test_filter_host(self):
         return self.config.getboolean("Settings", "speed_test_filter_host", fallback=False)
 
+    @property
+    def speed_test_cache_ttl(self):
+        return self.config.getint("Settings", "speed_test_cache_ttl", fallback=0)
+
+    @property
+    def speed_test_host_limit(self):
+        return self.config.getint("Settings", "speed_test_host_limit", fallback=0)
+
+    @property
+    def open_speed_test_sweep(self):
+        return self.config.getboolean("Settings", "open_speed_test_sweep", fallback=False)
+
+    @property
+    def speed_test_sweep_margin(self):
+        return self.config.getfloat("Settings", "speed_test_sweep_margin", fallback=2)
+
+    @property
+    def open_speed_test_early_stop(self):
+        return self.config.getboolean("Settings", "open_speed_test_early_stop", fallback=False)
+
+    @property
+    def speed_test_tolerance(self):
+        return self.config.getfloat("Settings", "speed_test_tolerance", fallback=0.1)
+
+    @property
+    def speed_test_max_size(self):
+        return self.config.getfloat("Settings", "speed_test_max_size", fallback=8)
+
+    @property
+    def speed_test_workers(self):
+        return self.config.getint("Settings", "speed_test_workers", fallback=0)
+
+    @property
+    def speed_test_ffmpeg_limit(self):
+        return self.config.getint("Settings", "speed_test_ffmpeg_limit", fallback=4)
+
+    @property
+    def speed_test_pool_limit(self):
+        return self.config.getint("Settings", "speed_test_pool_limit", fallback=100)
+
+    @property
+    def speed_test_pool_limit_per_host(self):
+        return self.config.getint("Settings", "speed_test_pool_limit_per_host", fallback=10)
+
+    @property
+    def speed_test_keepalive_timeout(self):
+        return self.config.getfloat("Settings", "speed_test_keepalive_timeout", fallback=15)
+
+    @property
+    def speed_test_dns_cache_ttl(self):
+        return self.config.getint("Settings", "speed_test_dns_cache_ttl", fallback=300)
+
+    @property
+    def dns_resolve_limit(self):
+        return self.config.getint("Settings", "dns_resolve_limit", fallback=100)
+
+    @property
+    def host_cache_ttl(self):
+        return self.config.getfloat("Settings", "host_cache_ttl", fallback=24)
+
     @property
     def cdn_url(self):
         return self.config.get("Settings", "cdn_url", fallback="")
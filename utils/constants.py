@@ -43,6 +43,14 @@ cache_path = os.path.join(output_dir, "data/cache.gz")
 
 frozen_path = os.path.join(output_dir, "data/frozen.gz")
 
+speed_test_cache_path = os.path.join(output_dir, "data/speed_test.gz")
+
+host_cache_path = os.path.join(output_dir, "data/host.gz")
+
+subscribe_cache_path = os.path.join(output_dir, "data/subscribe.gz")
+
+subscribe_stats_path = os.path.join(output_dir, "data/subscribe_stats.gz")
+
 speed_test_log_path = os.path.join(output_dir, "log/speed_test.log")
 
 result_log_path = os.path.join(output_dir, "log/result.log")
@@ -51,6 +59,8 @@ statistic_log_path = os.path.join(output_dir, "log/statistic.log")
 
 nomatch_log_path = os.path.join(output_dir, "log/nomatch.log")
 
+subscribe_log_path = os.path.join(output_dir, "log/subscribe.log")
+
 log_path = os.path.join(output_dir, "log/log.log")
 
 url_host_pattern = re.compile(r"((https?|rtmp|rtsp)://)?([^:@/]+(:[^:@/]*)?@)?(\[[0-9a-fA-F:]+]|([\w-]+\.)+[\w-]+)")
@@ -72,8 +82,12 @@ multiline_m3u_pattern = re.compile(
     r"^#EXTINF:-1[\s+,，](?P<attributes>[^,，]+)[，,](?P<name>.*?)\n(?P<options>(#EXTVLCOPT:.*\n)*?)(?P<value>.+)$",
     re.MULTILINE)
 
+m3u_extinf_pattern = re.compile(r"^#EXTINF:-1[\s+,，](?P<attributes>[^,，]+)[，,](?P<name>.*)$")
+
 key_value_pattern = re.compile(r'(?P<key>\w+)=(?P<value>\S+)')
 
+tvg_name_pattern = re.compile(r"(CCTV|CETV)-(\d+)(\+.*)?")
+
 sub_pattern = re.compile(
     r"-|_|\((.*?)\)|（(.*?)）|\[(.*?)]|「(.*?)」| |｜|频道|普清|标清|高清|HD|hd|超清|超高|超高清|4K|4k|中央|央视|电视台|台|电信|联通|移动")
 
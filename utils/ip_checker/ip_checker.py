@@ -1,17 +1,101 @@
+import asyncio
+import gzip
+import os
+import pickle
 import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 import ipdb
 
 from utils.tools import resource_path
 
+NEGATIVE_CACHE_TTL = 3600
+
+DEFINITIVE_ERRNOS = {errno for errno in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", None)) if errno is not None}
+
+
+def is_definitive_failure(error: Exception) -> bool:
+    """
+    Check if the resolution error means the host does not exist, rather than a transient failure
+    """
+    return isinstance(error, socket.gaierror) and error.errno in DEFINITIVE_ERRNOS
+
 
 class IPChecker:
-    def __init__(self):
+    def __init__(self, cache_path: str = None, cache_ttl: float = 0):
+        """
+        :param cache_path: The path of the host cache, which is loaded lazily on the first lookup
+        :param cache_ttl: The validity duration of the cached hosts in seconds, 0 to disable the cache
+        """
         self.db = ipdb.City(resource_path("utils/ip_checker/data/qqwry.ipdb"))
         self.url_host = {}
         self.host_ip = {}
         self.host_ipv_type = {}
+        self.host_time = {}
+        self.transient_hosts = set()
+        self.ip_map = {}
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self._cache_loaded = False
+
+    def _get_ttl(self, ip: str | None) -> float:
+        """
+        Get the cache TTL of a host, failed resolutions expire sooner
+        """
+        return self.cache_ttl if ip else min(self.cache_ttl, NEGATIVE_CACHE_TTL)
+
+    def _ensure_cache_loaded(self) -> None:
+        """
+        Load the fresh hosts of the cache file into memory once
+        """
+        if self._cache_loaded:
+            return
+        self._cache_loaded = True
+        if not self.cache_path or self.cache_ttl <= 0 or not os.path.exists(self.cache_path):
+            return
+        try:
+            with gzip.open(self.cache_path, "rb") as f:
+                data = pickle.load(f)
+            now = time.time()
+            for host, entry in data.items():
+                ip = entry.get("ip")
+                if host in self.host_ipv_type or now - entry.get("time", 0) >= self._get_ttl(ip):
+                    continue
+                self.host_ip[host] = ip
+                self.host_ipv_type[host] = entry.get("ipv_type")
+                self.host_time[host] = entry.get("time")
+                if ip and (entry.get("location") or entry.get("isp")):
+                    self.ip_map.setdefault(ip, (entry.get("location"), entry.get("isp")))
+        except Exception as e:
+            print(f"Error on loading host cache: {e}")
+
+    def save(self) -> None:
+        """
+        Save the fresh hosts to the cache file
+        """
+        if not self.cache_path or self.cache_ttl <= 0:
+            return
+        now = time.time()
+        data = {}
+        for host, ipv_type in self.host_ipv_type.items():
+            ip = self.host_ip.get(host)
+            if not ip and host in self.transient_hosts:
+                continue
+            resolved_time = self.host_time.get(host, now)
+            if now - resolved_time >= self._get_ttl(ip):
+                continue
+            location, isp = self.ip_map.get(ip, (None, None)) if ip else (None, None)
+            data[host] = {"ip": ip, "ipv_type": ipv_type, "time": resolved_time, "location": location, "isp": isp}
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                pickle.dump(data, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            print(f"Error on saving host cache: {e}")
 
     def get_host(self, url: str) -> str:
         """
@@ -28,6 +112,7 @@ class IPChecker:
         """
         Get the IP from a URL
         """
+        self._ensure_cache_loaded()
         host = self.get_host(url)
         if host in self.host_ip:
             return self.host_ip[host]
@@ -39,34 +124,91 @@ class IPChecker:
         """
         Get the IPv type of URL
         """
+        self._ensure_cache_loaded()
         host = self.get_host(url)
         if host in self.host_ipv_type:
             return self.host_ipv_type[host]
 
+        cacheable = True
         try:
             addr_info = socket.getaddrinfo(host, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
-            ip = next((info[4][0] for info in addr_info if info[0] == socket.AF_INET6), None)
-            if not ip:
-                ip = next((info[4][0] for info in addr_info if info[0] == socket.AF_INET), None)
-            ipv_type = "ipv6" if any(info[0] == socket.AF_INET6 for info in addr_info) else "ipv4"
         except Exception as e:
             print(f"Error on getting IPv type for {host}: {e}")
-            ip = None
-            ipv_type = "ipv4"
+            addr_info = []
+            cacheable = is_definitive_failure(e)
+        return self._apply_addr_info(host, addr_info, cacheable)
 
+    def _apply_addr_info(self, host: str, addr_info: list, cacheable: bool = True) -> str:
+        """
+        Save the IP and IPv type of the host from the address info, return the IPv type
+        :param cacheable: Whether the result is saved to the cache file, false for transient failures
+        """
+        ip = next((info[4][0] for info in addr_info if info[0] == socket.AF_INET6), None)
+        if not ip:
+            ip = next((info[4][0] for info in addr_info if info[0] == socket.AF_INET), None)
+        ipv_type = "ipv6" if any(info[0] == socket.AF_INET6 for info in addr_info) else "ipv4"
         self.host_ip[host] = ip
         self.host_ipv_type[host] = ipv_type
+        self.host_time[host] = time.time()
+        if cacheable:
+            self.transient_hosts.discard(host)
+        else:
+            self.transient_hosts.add(host)
         return ipv_type
 
+    async def resolve_hosts(self, urls, limit: int = 100, timeout: float = 10) -> int:
+        """
+        Resolve the hosts of the URLs concurrently, filling the IP and IPv type of the hosts
+        :param urls: The URLs to resolve
+        :param limit: The maximum number of hosts resolved at the same time
+        :param timeout: The timeout of resolving each host
+        :return: The number of hosts resolved
+        """
+        self._ensure_cache_loaded()
+        hosts = {self.get_host(url) for url in urls} - self.host_ipv_type.keys()
+        if not hosts:
+            return 0
+        loop = asyncio.get_running_loop()
+        limit = max(1, limit)
+        # A dedicated executor, the lookups do not queue behind the default executor and its timeout
+        executor = ThreadPoolExecutor(max_workers=min(limit, len(hosts)))
+        semaphore = asyncio.Semaphore(limit)
+
+        async def resolve(host: str):
+            async with semaphore:
+                try:
+                    addr_info = await asyncio.wait_for(
+                        loop.run_in_executor(
+                            executor, socket.getaddrinfo, host, None, socket.AF_UNSPEC, socket.SOCK_STREAM
+                        ),
+                        timeout
+                    )
+                except asyncio.TimeoutError:
+                    # Left unresolved, the host is looked up again when it is used
+                    return
+                except Exception as e:
+                    self._apply_addr_info(host, [], is_definitive_failure(e))
+                    return
+                self._apply_addr_info(host, addr_info)
+
+        try:
+            await asyncio.gather(*(resolve(host) for host in hosts))
+        finally:
+            executor.shutdown(wait=False)
+        return len(hosts)
+
     def find_map(self, ip: str) -> tuple[str | None, str | None]:
         """
         Find the IP address and return the location and ISP
         :param ip: The IP address to find
         :return: A tuple of (location, ISP)
         """
+        if ip in self.ip_map:
+            return self.ip_map[ip]
         try:
             result = self.db.find_map(ip, "CN")
             if not result:
+                self.ip_map[ip] = (None, None)
                 return None, None
 
             location_parts = [
@@ -77,6 +219,7 @@ class IPChecker:
             location = "-".join(filter(None, location_parts))
             isp = result.get('isp_domain', None)
 
+            self.ip_map[ip] = (location, isp)
             return location, isp
         except Exception as e:
             print(f"Error on finding ip location and ISP: {e}")
@@ -0,0 +1,113 @@
+import asyncio
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from time import time
+
+
+class HostLimiter:
+    """
+    Concurrency limiter that admits work per host, with a global limit, a per-host cap
+    and round-robin fairness across the hosts that are waiting
+    """
+
+    def __init__(self, limit: int, host_limit: int = 0):
+        self.limit = max(1, limit)
+        self.host_limit = host_limit
+        self._active = 0
+        self._host_active: dict[str, int] = defaultdict(int)
+        self._waiters: dict[str, deque[asyncio.Future]] = {}
+        self.stats: dict[str, dict[str, float]] = defaultdict(
+            lambda: {"total": 0, "max_queue": 0, "wait": 0.0, "max_wait": 0.0}
+        )
+
+    def _can_admit(self, host: str) -> bool:
+        """
+        Check if the host can take a slot now
+        """
+        if self._active >= self.limit:
+            return False
+        return self.host_limit <= 0 or self._host_active.get(host, 0) < self.host_limit
+
+    def _dispatch(self) -> None:
+        """
+        Admit waiters, one per host per round, rotating admitted hosts to the end of the queue
+        """
+        while self._waiters and self._active < self.limit:
+            admitted = False
+            for host in list(self._waiters):
+                if self._active >= self.limit:
+                    break
+                if not self._can_admit(host):
+                    continue
+                queue = self._waiters.pop(host)
+                while queue and queue[0].done():
+                    queue.popleft()
+                if not queue:
+                    continue
+                queue.popleft().set_result(None)
+                if queue:
+                    self._waiters[host] = queue
+                self._active += 1
+                self._host_active[host] += 1
+                admitted = True
+            if not admitted:
+                break
+
+    async def acquire(self, host: str) -> float:
+        """
+        Wait for a slot for the host, return the wait time in seconds
+        """
+        host = host or ""
+        stats = self.stats[host]
+        stats["total"] += 1
+        future = asyncio.get_running_loop().create_future()
+        queue = self._waiters.setdefault(host, deque())
+        queue.append(future)
+        stats["max_queue"] = max(stats["max_queue"], len(queue))
+        start_time = time()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(host)
+            else:
+                queue = self._waiters.get(host)
+                if queue and future in queue:
+                    queue.remove(future)
+                    if not queue:
+                        self._waiters.pop(host, None)
+            raise
+        wait = time() - start_time
+        stats["wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+        return wait
+
+    def release(self, host: str) -> None:
+        """
+        Release the slot held for the host
+        """
+        host = host or ""
+        self._active -= 1
+        self._host_active[host] -= 1
+        if self._host_active[host] <= 0:
+            del self._host_active[host]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """
+        Hold a slot for the host within the context
+        """
+        await self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def get_queue_depth(self, host: str) -> int:
+        """
+        Get the number of tasks waiting for the host
+        """
+        queue = self._waiters.get(host or "")
+        return len(queue) if queue else 0
@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Iterable, Iterator
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton for matching many keywords against a text in a single pass.
+    Small keyword sets are scanned directly, which is faster than walking the automaton.
+    """
+
+    linear_limit = 128
+
+    def __init__(self, keywords: Iterable[str] = ()):
+        self.keywords: list[str] = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[tuple[int, ...]] = [()]
+        if len(self.keywords) > self.linear_limit:
+            self._build()
+
+    def _build(self) -> None:
+        """
+        Build the trie of the keywords, then the failure links and outputs in BFS order
+        """
+        goto, output = self._goto, self._output
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(())
+                state = next_state
+            output[state] += (index,)
+        fail = self._fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                candidate = goto[fallback].get(char, 0)
+                fail[next_state] = candidate if candidate != next_state else 0
+                output[next_state] += output[fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keywords)
+
+    def iter_matches(self, text: str) -> Iterator[int]:
+        """
+        Yield the index of every keyword found in the text, a keyword may be yielded more than once
+        """
+        if len(self.keywords) <= self.linear_limit:
+            for index, keyword in enumerate(self.keywords):
+                if keyword in text:
+                    yield index
+            return
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield from output[state]
+
+    def search(self, text: str) -> bool:
+        """
+        Check if any keyword is found in the text
+        """
+        if not text:
+            return False
+        for _ in self.iter_matches(text):
+            return True
+        return False
@@ -0,0 +1,312 @@
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+stream_type_codec = {
+    0x01: "mpeg1video",
+    0x02: "mpeg2video",
+    0x1B: "h264",
+    0x24: "hevc",
+}
+
+h264_high_profiles = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+
+class BitReader:
+    """
+    Big-endian bit reader with Exp-Golomb support
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def read_bits(self, n: int) -> int:
+        value = 0
+        for _ in range(n):
+            byte_index = self.pos >> 3
+            if byte_index >= len(self.data):
+                raise ValueError("Read beyond the end of data")
+            value = (value << 1) | ((self.data[byte_index] >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+    def skip_bits(self, n: int) -> None:
+        self.pos += n
+        if self.pos > len(self.data) * 8:
+            raise ValueError("Skip beyond the end of data")
+
+    def read_ue(self) -> int:
+        leading_zeros = 0
+        while self.read_bits(1) == 0:
+            leading_zeros += 1
+            if leading_zeros > 31:
+                raise ValueError("Invalid Exp-Golomb code")
+        return (1 << leading_zeros) - 1 + self.read_bits(leading_zeros)
+
+    def read_se(self) -> int:
+        value = self.read_ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def remove_emulation_prevention(data: bytes) -> bytes:
+    """
+    Remove the emulation prevention bytes (00 00 03) from the NAL unit payload
+    """
+    return data.replace(b"\x00\x00\x03", b"\x00\x00")
+
+
+def find_sync_offset(data: bytes) -> int:
+    """
+    Find the offset of the first TS packet, -1 if the data is not a transport stream
+    """
+    for offset in range(min(TS_PACKET_SIZE, len(data))):
+        if data[offset] != TS_SYNC_BYTE:
+            continue
+        if all(data[i] == TS_SYNC_BYTE for i in range(offset, min(len(data), offset + TS_PACKET_SIZE * 3),
+                                                      TS_PACKET_SIZE)):
+            return offset
+    return -1
+
+
+def iter_ts_payloads(data: bytes):
+    """
+    Yield (pid, payload_unit_start, payload) for every TS packet of the data
+    """
+    offset = find_sync_offset(data)
+    if offset < 0:
+        return
+    end = len(data) - TS_PACKET_SIZE
+    while offset <= end:
+        if data[offset] != TS_SYNC_BYTE:
+            offset = offset + 1
+            continue
+        header = data[offset + 1]
+        pid = ((header & 0x1F) << 8) | data[offset + 2]
+        adaptation_field_control = (data[offset + 3] >> 4) & 0x03
+        payload_start = offset + 4
+        if adaptation_field_control in (2, 3):
+            payload_start += 1 + data[offset + 4]
+        if adaptation_field_control in (1, 3) and payload_start < offset + TS_PACKET_SIZE:
+            yield pid, bool(header & 0x40), data[payload_start:offset + TS_PACKET_SIZE]
+        offset += TS_PACKET_SIZE
+
+
+def get_psi_section(payload: bytes) -> bytes:
+    """
+    Get the PSI section from a payload that starts a new unit
+    """
+    pointer_field = payload[0]
+    section = payload[1 + pointer_field:]
+    section_length = ((section[1] & 0x0F) << 8) | section[2]
+    return section[:3 + section_length]
+
+
+def parse_pat(payload: bytes) -> list[int]:
+    """
+    Parse the PAT section and return the PMT pids
+    """
+    section = get_psi_section(payload)
+    if section[0] != 0x00:
+        return []
+    pids = []
+    for i in range(8, len(section) - 4, 4):
+        program_number = (section[i] << 8) | section[i + 1]
+        if program_number:
+            pids.append(((section[i + 2] & 0x1F) << 8) | section[i + 3])
+    return pids
+
+
+def parse_pmt(payload: bytes) -> tuple[int, int] | None:
+    """
+    Parse the PMT section and return (pid, stream_type) of the first video stream
+    """
+    section = get_psi_section(payload)
+    if section[0] != 0x02:
+        return None
+    program_info_length = ((section[10] & 0x0F) << 8) | section[11]
+    i = 12 + program_info_length
+    end = len(section) - 4
+    while i + 5 <= end:
+        stream_type = section[i]
+        elementary_pid = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+        es_info_length = ((section[i + 3] & 0x0F) << 8) | section[i + 4]
+        if stream_type in stream_type_codec:
+            return elementary_pid, stream_type
+        i += 5 + es_info_length
+    return None
+
+
+def get_pes_payload(payload: bytes) -> bytes:
+    """
+    Strip the PES header from a payload that starts a new PES packet
+    """
+    if payload[:3] != b"\x00\x00\x01" or len(payload) < 9:
+        return payload
+    return payload[9 + payload[8]:]
+
+
+def iter_nal_units(data: bytes):
+    """
+    Yield every NAL unit (without start code) of an Annex B byte stream
+    """
+    start = data.find(b"\x00\x00\x01")
+    while start >= 0:
+        start += 3
+        end = data.find(b"\x00\x00\x01", start)
+        nal = data[start:end] if end >= 0 else data[start:]
+        yield nal.rstrip(b"\x00") if end >= 0 else nal
+        start = end
+
+
+def _skip_h264_scaling_list(reader: BitReader, size: int) -> None:
+    last_scale = next_scale = 8
+    for _ in range(size):
+        if next_scale:
+            next_scale = (last_scale + reader.read_se() + 256) % 256
+        last_scale = next_scale or last_scale
+
+
+def parse_h264_sps(nal: bytes) -> tuple[int, int]:
+    """
+    Parse the width and height from an H.264 SPS NAL unit
+    """
+    reader = BitReader(remove_emulation_prevention(nal[1:]))
+    profile_idc = reader.read_bits(8)
+    reader.skip_bits(16)
+    reader.read_ue()
+    chroma_format_idc = 1
+    separate_colour_plane = 0
+    if profile_idc in h264_high_profiles:
+        chroma_format_idc = reader.read_ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = reader.read_bits(1)
+        reader.read_ue()
+        reader.read_ue()
+        reader.skip_bits(1)
+        if reader.read_bits(1):
+            for i in range(8 if chroma_format_idc != 3 else 12):
+                if reader.read_bits(1):
+                    _skip_h264_scaling_list(reader, 16 if i < 6 else 64)
+    reader.read_ue()
+    pic_order_cnt_type = reader.read_ue()
+    if pic_order_cnt_type == 0:
+        reader.read_ue()
+    elif pic_order_cnt_type == 1:
+        reader.skip_bits(1)
+        reader.read_se()
+        reader.read_se()
+        for _ in range(reader.read_ue()):
+            reader.read_se()
+    reader.read_ue()
+    reader.skip_bits(1)
+    pic_width_in_mbs = reader.read_ue() + 1
+    pic_height_in_map_units = reader.read_ue() + 1
+    frame_mbs_only = reader.read_bits(1)
+    if not frame_mbs_only:
+        reader.skip_bits(1)
+    reader.skip_bits(1)
+    width = pic_width_in_mbs * 16
+    height = (2 - frame_mbs_only) * pic_height_in_map_units * 16
+    if reader.read_bits(1):
+        crop_left, crop_right, crop_top, crop_bottom = (reader.read_ue() for _ in range(4))
+        if separate_colour_plane or chroma_format_idc == 0:
+            crop_unit_x, crop_unit_y = 1, 2 - frame_mbs_only
+        else:
+            crop_unit_x = 2 if chroma_format_idc in (1, 2) else 1
+            crop_unit_y = (2 if chroma_format_idc == 1 else 1) * (2 - frame_mbs_only)
+        width -= crop_unit_x * (crop_left + crop_right)
+        height -= crop_unit_y * (crop_top + crop_bottom)
+    return width, height
+
+
+def parse_hevc_sps(nal: bytes) -> tuple[int, int]:
+    """
+    Parse the width and height from an H.265 SPS NAL unit
+    """
+    reader = BitReader(remove_emulation_prevention(nal[2:]))
+    reader.skip_bits(4)
+    max_sub_layers_minus1 = reader.read_bits(3)
+    reader.skip_bits(1)
+    reader.skip_bits(96)
+    sub_layer_flags = [(reader.read_bits(1), reader.read_bits(1)) for _ in range(max_sub_layers_minus1)]
+    if max_sub_layers_minus1 > 0:
+        reader.skip_bits(2 * (8 - max_sub_layers_minus1))
+    for profile_present, level_present in sub_layer_flags:
+        if profile_present:
+            reader.skip_bits(88)
+        if level_present:
+            reader.skip_bits(8)
+    reader.read_ue()
+    chroma_format_idc = reader.read_ue()
+    if chroma_format_idc == 3:
+        reader.skip_bits(1)
+    width = reader.read_ue()
+    height = reader.read_ue()
+    if reader.read_bits(1):
+        conf_left, conf_right, conf_top, conf_bottom = (reader.read_ue() for _ in range(4))
+        sub_width_c = 2 if chroma_format_idc in (1, 2) else 1
+        sub_height_c = 2 if chroma_format_idc == 1 else 1
+        width -= sub_width_c * (conf_left + conf_right)
+        height -= sub_height_c * (conf_top + conf_bottom)
+    return width, height
+
+
+def parse_mpeg2_sequence_header(data: bytes) -> tuple[int, int] | None:
+    """
+    Parse the width and height from an MPEG-1/2 sequence header
+    """
+    index = data.find(b"\x00\x00\x01\xb3")
+    if index < 0 or index + 7 > len(data):
+        return None
+    b0, b1, b2 = data[index + 4:index + 7]
+    return (b0 << 4) | (b1 >> 4), ((b1 & 0x0F) << 8) | b2
+
+
+def get_video_size_from_es(data: bytes, codec: str) -> tuple[int, int] | None:
+    """
+    Get the video size from the elementary stream of the codec
+    """
+    if codec in ("mpeg1video", "mpeg2video"):
+        return parse_mpeg2_sequence_header(data)
+    for nal in iter_nal_units(data):
+        if not nal:
+            continue
+        try:
+            if codec == "h264" and nal[0] & 0x1F == 7:
+                return parse_h264_sps(nal)
+            if codec == "hevc" and (nal[0] >> 1) & 0x3F == 33:
+                return parse_hevc_sps(nal)
+        except (ValueError, IndexError):
+            continue
+    return None
+
+
+def get_ts_video_info(data: bytes) -> tuple[str | None, str | None]:
+    """
+    Get the resolution and codec of the first video stream in the MPEG-TS data
+    :param data: The MPEG-TS bytes, e.g. the head of a downloaded segment
+    :return: A tuple of (resolution, codec)
+    """
+    pmt_pids = set()
+    video_pid = None
+    codec = None
+    es_data = bytearray()
+    try:
+        for pid, unit_start, payload in iter_ts_payloads(data):
+            if pid == 0 and unit_start and not pmt_pids:
+                pmt_pids.update(parse_pat(payload))
+            elif pid in pmt_pids and unit_start and video_pid is None:
+                video_stream = parse_pmt(payload)
+                if video_stream:
+                    video_pid, stream_type = video_stream
+                    codec = stream_type_codec[stream_type]
+            elif pid == video_pid and (es_data or unit_start):
+                es_data += get_pes_payload(payload) if unit_start else payload
+    except IndexError:
+        pass
+    if not codec:
+        return None, None
+    size = get_video_size_from_es(bytes(es_data), codec)
+    if not size or not all(size):
+        return None, codec
+    return f"{size[0]}x{size[1]}", codec
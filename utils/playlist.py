@@ -0,0 +1,77 @@
+import codecs
+
+import utils.constants as constants
+from utils.tools import get_name_value_item
+
+
+class PlaylistParser:
+    """
+    Incremental parser of the txt and m3u playlists, fed with the chunks of the response body as they arrive.
+    The format is decided by the first non-empty line and switched to m3u by a later #EXTM3U or #EXTINF line,
+    a m3u entry is the #EXTINF line, the optional #EXTVLCOPT lines and the url line
+    """
+
+    def __init__(self, open_headers: bool = False):
+        self.open_headers = open_headers
+        self.m3u_type: bool | None = None
+        self.size = 0
+        self.empty = True
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._buffer = ""
+        self._entry: dict | None = None
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        """
+        Feed a chunk of the body, return the entries completed by it
+        """
+        self.size += len(chunk)
+        lines = (self._buffer + self._decoder.decode(chunk)).split("\n")
+        self._buffer = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self) -> list[dict]:
+        """
+        Flush the rest of the body, return the last entries
+        """
+        rest = self._buffer + self._decoder.decode(b"", final=True)
+        self._buffer = ""
+        result = self._parse_lines([rest]) if rest else []
+        self._entry = None
+        return result
+
+    def _parse_lines(self, lines: list[str]) -> list[dict]:
+        result = []
+        for line in lines:
+            line = line.strip()
+            if self.m3u_type is None:
+                line = line.lstrip("\ufeff")
+                if not line:
+                    continue
+                self.empty = False
+                self.m3u_type = line.startswith(("#EXTM3U", "#EXTINF"))
+            elif not self.m3u_type and line.startswith(("#EXTM3U", "#EXTINF")):
+                self.m3u_type = True
+            if self.m3u_type:
+                item = self._parse_m3u_line(line)
+            else:
+                match = constants.txt_pattern.match(line)
+                item = get_name_value_item(match.groupdict()) if match else None
+            if item is not None:
+                result.append(item)
+        return result
+
+    def _parse_m3u_line(self, line: str) -> dict | None:
+        entry = self._entry
+        if entry is not None:
+            if line.startswith("#EXTVLCOPT:"):
+                entry["options"] += f"{line}\n"
+                return None
+            self._entry = None
+            if line:
+                entry["value"] = line
+                return get_name_value_item(entry, self.open_headers)
+            return None
+        match = constants.m3u_extinf_pattern.match(line)
+        if match:
+            self._entry = {**match.groupdict(), "options": ""}
+        return None
@@ -0,0 +1,137 @@
+import copy
+import sys
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Iterator
+
+from utils.tools import get_resolution_value
+
+_MISSING = object()
+
+
+class ChannelRecord(MutableMapping):
+    """
+    Compact channel data record, a drop-in replacement for the channel data dict.
+    The known keys are stored in slots, with the host, origin and IPv type strings interned,
+    unset keys are missing like in a dict, and unknown keys fall back to an extra dict
+    """
+
+    fields = (
+        "id", "url", "host", "date", "delay", "speed", "resolution", "origin", "ipv_type", "location", "isp",
+        "headers", "catchup", "extra_info",
+    )
+    interned_fields = frozenset(("host", "origin", "ipv_type"))
+    __slots__ = fields + ("resolution_value", "_extra")
+
+    def __init__(self, data: Mapping | None = None, /, **kwargs):
+        self.resolution_value = 0
+        self._extra = None
+        if data:
+            for key, value in data.items():
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _field_set:
+            value = getattr(self, key, _MISSING)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in _field_set:
+            if key in self.interned_fields and type(value) is str:
+                value = sys.intern(value)
+            elif key == "resolution":
+                self.resolution_value = get_resolution_value(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in _field_set:
+            if getattr(self, key, _MISSING) is _MISSING:
+                raise KeyError(key)
+            delattr(self, key)
+            if key == "resolution":
+                self.resolution_value = 0
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.fields:
+            if getattr(self, key, _MISSING) is not _MISSING:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, key: object) -> bool:
+        if key in _field_set:
+            return getattr(self, key, _MISSING) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _field_set:
+            value = getattr(self, key, _MISSING)
+            return default if value is _MISSING else value
+        if self._extra is None:
+            return default
+        return self._extra.get(key, default)
+
+    def copy(self) -> "ChannelRecord":
+        """
+        Get a shallow copy of the record
+        """
+        record = ChannelRecord.__new__(ChannelRecord)
+        for key in self.__slots__:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                setattr(record, key, value)
+        if self._extra is not None:
+            record._extra = dict(self._extra)
+        return record
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo: dict) -> "ChannelRecord":
+        record = self.copy()
+        memo[id(self)] = record
+        for key in ("headers", "catchup"):
+            value = getattr(record, key, None)
+            if value is not None:
+                setattr(record, key, copy.deepcopy(value, memo))
+        if record._extra is not None:
+            record._extra = copy.deepcopy(record._extra, memo)
+        return record
+
+    def __reduce__(self):
+        """
+        Pickle the record as a plain dict, so the cache files stay readable without this class
+        """
+        return dict, (dict(self),)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self)!r})"
+
+
+_field_set = frozenset(ChannelRecord.fields)
+
+
+def get_record_resolution_value(item: Mapping) -> int:
+    """
+    Get the numeric resolution of the channel data, precomputed for the records
+    """
+    if isinstance(item, ChannelRecord):
+        return item.resolution_value
+    return get_resolution_value(item.get("resolution"))
+
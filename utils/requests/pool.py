@@ -0,0 +1,90 @@
+from aiohttp import ClientSession, DummyCookieJar, TCPConnector, TraceConfig
+
+from utils.config import config
+
+
+class ConnectionPool:
+    """
+    Run-scoped aiohttp session with a shared, keep-alive connection pool.
+    Cookies are not kept, so each request stays independent like with a session per url
+    """
+
+    def __init__(
+            self,
+            limit: int = None,
+            limit_per_host: int = None,
+            keepalive_timeout: float = None,
+            dns_cache_ttl: int = None,
+    ):
+        self.limit = config.speed_test_pool_limit if limit is None else limit
+        self.limit_per_host = config.speed_test_pool_limit_per_host if limit_per_host is None else limit_per_host
+        self.keepalive_timeout = config.speed_test_keepalive_timeout if keepalive_timeout is None else keepalive_timeout
+        self.dns_cache_ttl = config.speed_test_dns_cache_ttl if dns_cache_ttl is None else dns_cache_ttl
+        self.session: ClientSession | None = None
+        self.stats = {"hit": 0, "miss": 0, "dns_hit": 0, "dns_miss": 0}
+
+    def _create_trace_config(self) -> TraceConfig:
+        """
+        Create the trace config used to count connection and dns cache hits
+        """
+        trace_config = TraceConfig()
+
+        def counter(key):
+            async def on_event(session, context, params):
+                self.stats[key] += 1
+
+            return on_event
+
+        trace_config.on_connection_reuseconn.append(counter("hit"))
+        trace_config.on_connection_create_end.append(counter("miss"))
+        trace_config.on_dns_cache_hit.append(counter("dns_hit"))
+        trace_config.on_dns_cache_miss.append(counter("dns_miss"))
+        return trace_config
+
+    async def open(self) -> ClientSession:
+        """
+        Open the shared session, reusing it if it is already open
+        """
+        if self.session is None or self.session.closed:
+            connector = TCPConnector(
+                ssl=False,
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout if self.keepalive_timeout > 0 else None,
+                force_close=self.keepalive_timeout <= 0,
+                use_dns_cache=self.dns_cache_ttl > 0,
+                ttl_dns_cache=self.dns_cache_ttl if self.dns_cache_ttl > 0 else None,
+            )
+            self.session = ClientSession(
+                connector=connector,
+                trust_env=True,
+                cookie_jar=DummyCookieJar(),
+                trace_configs=[self._create_trace_config()],
+            )
+        return self.session
+
+    async def close(self) -> None:
+        """
+        Close the shared session and release all pooled connections
+        """
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def get_stats(self) -> dict[str, int | float]:
+        """
+        Get the connection pool hit/miss counters
+        """
+        total = self.stats["hit"] + self.stats["miss"]
+        dns_total = self.stats["dns_hit"] + self.stats["dns_miss"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hit"] / total * 100 if total else 0,
+            "dns_hit_rate": self.stats["dns_hit"] / dns_total * 100 if dns_total else 0,
+        }
+
+    async def __aenter__(self) -> ClientSession:
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.close()
@@ -1,3 +1,4 @@
+import asyncio
 from time import sleep
 
 from utils.i18n import t
@@ -21,3 +22,21 @@ def retry_func(func, retries=max_retries, name=""):
                     t("msg.failed_retry_max").format(name=name)
                 )
     raise Exception(t("msg.failed_retry_max").format(name=name))
+
+
+async def retry_async_func(func, retries=max_retries, name=""):
+    """
+    Retry the async function
+    """
+    for i in range(retries):
+        try:
+            await asyncio.sleep(1)
+            return await func()
+        except Exception as e:
+            if name and i < retries - 1:
+                print(t("msg.failed_retrying_count").format(name=name, count=i + 1))
+            elif i == retries - 1:
+                raise Exception(
+                    t("msg.failed_retry_max").format(name=name)
+                )
+    raise Exception(t("msg.failed_retry_max").format(name=name))
@@ -1,8 +1,10 @@
 import asyncio
 import http.cookies
-import json
 import re
 import subprocess
+import weakref
+from collections import deque
+from copy import copy
 from time import time
 from urllib.parse import quote, urljoin
 
@@ -12,8 +14,11 @@ from multidict import CIMultiDictProxy
 
 # 注意：以下导入需确保你的项目目录结构正确，若运行报错需检查utils模块路径
 import utils.constants as constants
+import utils.speed_store as speed_store
 from utils.config import config
 from utils.i18n import t
+from utils.mpegts import get_ts_video_info
+from utils.record import get_record_resolution_value
 from utils.requests.tools import headers as request_headers
 from utils.tools import get_resolution_value
 from utils.types import TestResult, ChannelTestResult, TestResultCacheData
@@ -23,6 +28,10 @@ http.cookies._is_legal_key = lambda _: True
 cache: TestResultCacheData = {}
 speed_test_timeout = config.speed_test_timeout
 speed_test_filter_host = config.speed_test_filter_host
+speed_test_tolerance = config.speed_test_tolerance
+speed_test_ffmpeg_limit = config.speed_test_ffmpeg_limit
+_probe_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+speed_test_max_size = int(config.speed_test_max_size * 1024 * 1024)
 open_filter_resolution = config.open_filter_resolution
 min_resolution_value = config.min_resolution_value
 max_resolution_value = config.max_resolution_value
@@ -30,6 +39,7 @@ open_supply = config.open_supply
 open_filter_speed = config.open_filter_speed
 min_speed_value = config.min_speed
 m3u8_headers = ['application/x-mpegurl', 'application/vnd.apple.mpegurl', 'audio/mpegurl', 'audio/x-mpegurl']
+ts_head_size = 256 * 1024
 default_ipv6_delay = 0.1
 default_ipv6_resolution = "1920x1080"
 default_ipv6_result = {
@@ -67,15 +77,64 @@ def print_startup_info():
 # ==================================================================
 
 
+class ThroughputSampler:
+    """
+    Running throughput estimate over fixed size download blocks, done once the speed of the last
+    blocks is stable within the tolerance or the size budget is used up
+    """
+
+    def __init__(self, tolerance: float = speed_test_tolerance, max_size: int = speed_test_max_size,
+                 block_size: int = 256 * 1024, window: int = 3):
+        self.tolerance = tolerance
+        self.max_size = max_size
+        self.block_size = block_size
+        self.size = 0
+        self.time = 0.0
+        self._block_bytes = 0
+        self._block_time = 0.0
+        self._block_speeds = deque(maxlen=window)
+
+    def add(self, size: int, elapsed: float) -> None:
+        """
+        Add the bytes received and the time elapsed since the last add
+        """
+        self.size += size
+        self.time += elapsed
+        self._block_bytes += size
+        self._block_time += elapsed
+        if self._block_bytes >= self.block_size and self._block_time > 0:
+            self._block_speeds.append(self._block_bytes / self._block_time)
+            self._block_bytes = 0
+            self._block_time = 0.0
+
+    @property
+    def converged(self) -> bool:
+        speeds = self._block_speeds
+        if len(speeds) < speeds.maxlen:
+            return False
+        mean = sum(speeds) / len(speeds)
+        return mean > 0 and max(speeds) - min(speeds) <= self.tolerance * mean
+
+    @property
+    def done(self) -> bool:
+        return (0 < self.max_size <= self.size) or self.converged
+
+    @property
+    def speed(self) -> float:
+        return self.size / self.time / 1024 / 1024 if self.time > 0 else 0
+
+
 async def get_speed_with_download(url: str, headers: dict = None, session: ClientSession = None,
-                                  timeout: int = speed_test_timeout) -> dict[
-    str, float | None]:
+                                  timeout: int = speed_test_timeout, head_size: int = 0,
+                                  sampler: ThroughputSampler = None) -> dict[str, float | None]:
     """
-    Get the speed of the url with a total timeout（原有逻辑未修改）
+    Get the speed of the url with a total timeout, keep the first head_size bytes for stream sniffing,
+    the download stops early once the sampler is done
     """
     start_time = time()
     delay = -1
     total_size = 0
+    head = bytearray()
     if session is None:
         session = ClientSession(connector=TCPConnector(ssl=False), trust_env=True)
         created_session = True
@@ -86,21 +145,35 @@ async def get_speed_with_download(url: str, headers: dict = None, session: Clien
             if response.status != 200:
                 raise Exception("Invalid response")
             delay = int(round((time() - start_time) * 1000))
+            # The request and the time to the first byte are counted into the first chunk, so the sampled
+            # speed stays comparable with the whole request timing the min_speed filter was tuned on
+            last_time = start_time
             async for chunk in response.content.iter_any():
                 if chunk:
                     total_size += len(chunk)
+                    if len(head) < head_size:
+                        head += chunk[:head_size - len(head)]
+                    if sampler:
+                        now = time()
+                        sampler.add(len(chunk), now - last_time)
+                        last_time = now
+                        if sampler.done and len(head) >= head_size:
+                            break
+    except asyncio.CancelledError:
+        raise
     except:
         pass
     finally:
-        total_time = time() - start_time
         if created_session:
             await session.close()
-        return {
-            'speed': total_size / total_time / 1024 / 1024,
-            'delay': delay,
-            'size': total_size,
-            'time': total_time,
-        }
+    total_time = time() - start_time
+    return {
+        'speed': total_size / total_time / 1024 / 1024,
+        'delay': delay,
+        'size': total_size,
+        'time': total_time,
+        'head': bytes(head),
+    }
 
 
 async def get_headers(url: str, headers: dict = None, session: ClientSession = None, timeout: int = 5) -> \
@@ -118,12 +191,14 @@ async def get_headers(url: str, headers: dict = None, session: ClientSession = N
     try:
         async with session.head(url, headers=headers, timeout=timeout) as response:
             res_headers = response.headers
+    except asyncio.CancelledError:
+        raise
     except:
         pass
     finally:
         if created_session:
             await session.close()
-        return res_headers
+    return res_headers
 
 
 async def get_url_content(url: str, headers: dict = None, session: ClientSession = None,
@@ -143,12 +218,14 @@ async def get_url_content(url: str, headers: dict = None, session: ClientSession
                 content = await response.text()
             else:
                 raise Exception("Invalid response")
+    except asyncio.CancelledError:
+        raise
     except:
         pass
     finally:
         if created_session:
             await session.close()
-        return content
+    return content
 
 
 def check_m3u8_valid(headers: CIMultiDictProxy[str] | dict[any, any]) -> bool:
@@ -161,190 +238,124 @@ def check_m3u8_valid(headers: CIMultiDictProxy[str] | dict[any, any]) -> bool:
     return any(item in content_type for item in m3u8_headers)
 
 
-def _parse_time_to_seconds(t: str) -> float:
-    """
-    Parse time string to seconds（原有逻辑未修改）
-    """
-    if not t:
-        return 0.0
-    parts = [p.strip() for p in t.split(':') if p.strip() != ""]
-    if not parts:
-        return 0.0
-    try:
-        total = 0.0
-        for i, part in enumerate(reversed(parts)):
-            total += float(part) * (60 ** i)
-        return total
-    except Exception:
-        return 0.0
-
-
-def _try_extract_speed_from_ffmpeg_output(output: str) -> float | None:
-    """
-    Try to extract speed from ffmpeg output（仅优化解析优先级，优先用流媒体真实码率）
-    """
-
-    def parse_size_value(value_str: str, unit: str | None) -> float:
-        try:
-            val = float(value_str)
-        except Exception:
-            return 0.0
-        if not unit:
-            return val
-        unit_lower = unit.lower()
-        if unit_lower in ("b", "bytes"):
-            return val
-        if unit_lower in ("kib", "k"):
-            return val * 1024.0
-        if unit_lower in ("kb",):
-            return val * 1000.0
-        if unit_lower in ("mib", "mb"):
-            return val * 1024.0 * 1024.0
-        return val
-
-    # ========== 测速准确度优化：优先解析ffmpeg的bitrate（真实流媒体码率，最贴近实际播放速度） ==========
-    try:
-        m_bitrate = re.search(r"bitrate=\s*([0-9\.]+)\s*k?bits/s", output)
-        if m_bitrate:
-            kbps = float(m_bitrate.group(1))
-            return kbps / 8.0 / 1024.0  # kbps → MB/s（1MB=8192kb）
-    except Exception:
-        pass
-
-    # 原有解析逻辑（兜底，保留不变）
-    try:
-        total_bytes = 0.0
-        m_video = re.search(r"video:\s*([0-9]+(?:\.[0-9]+)?)\s*(KiB|MiB|kB|B|kb|KB)?", output, re.IGNORECASE)
-        m_audio = re.search(r"audio:\s*([0-9]+(?:\.[0-9]+)?)\s*(KiB|MiB|kB|B|kb|KB)?", output, re.IGNORECASE)
-        if m_video:
-            total_bytes += parse_size_value(m_video.group(1), m_video.group(2))
-        if m_audio:
-            total_bytes += parse_size_value(m_audio.group(1), m_audio.group(2))
-
-        m_time = re.search(r"time=\s*([0-9:\.]+)", output)
-        if total_bytes > 0 and m_time:
-            secs = _parse_time_to_seconds(m_time.group(1))
-            if secs > 0:
-                return total_bytes / secs / 1024.0 / 1024.0
-    except Exception:
-        pass
-
-    try:
-        m_lsize = re.search(r"Lsize=\s*([0-9]+(?:\.[0-9]+)?)\s*(KiB|kB|MiB|B|kb|KB)?", output, re.IGNORECASE)
-        m_size = re.search(r"size=\s*([0-9]+(?:\.[0-9]+)?)\s*(KiB|kB|MiB|B|kb|KB)?", output, re.IGNORECASE)
-        m_time = re.search(r"time=\s*([0-9:\.]+)", output)
-        size_bytes = 0.0
-        if m_lsize and m_lsize.group(1).upper() != "N/A":
-            size_bytes = parse_size_value(m_lsize.group(1), m_lsize.group(2))
-        elif m_size:
-            size_bytes = parse_size_value(m_size.group(1), m_size.group(2))
-        if size_bytes > 0 and m_time:
-            secs = _parse_time_to_seconds(m_time.group(1))
-            if secs > 0:
-                return size_bytes / secs / 1024.0 / 1024.0
-    except Exception:
-        pass
-
-    return None
-
-
 async def get_result(url: str, headers: dict = None, resolution: str = None,
                      filter_resolution: bool = config.open_filter_resolution,
-                     timeout: int = speed_test_timeout) -> dict[str, float | None]:
+                     timeout: int = speed_test_timeout, session: ClientSession = None) -> dict[str, float | None]:
     """
     Get the test result of the url（仅优化测速准确度，其余逻辑不变）
     """
     info = {'speed': 0, 'delay': -1, 'resolution': resolution}
     location = None
+    head_size = ts_head_size if filter_resolution and not resolution else 0
+    head = None
+    if session is None:
+        session = ClientSession(connector=TCPConnector(ssl=False), trust_env=True)
+        created_session = True
+    else:
+        created_session = False
     try:
         url = quote(url, safe=':/?$&=@[]%').partition('$')[0]
-        async with ClientSession(connector=TCPConnector(ssl=False), trust_env=True) as session:
-            res_headers = await get_headers(url, headers, session)
-            location = res_headers.get('Location')
-            if location:
-                info.update(await get_result(location, headers, resolution, filter_resolution, timeout))
-            else:
-                url_content = await get_url_content(url, headers, session, timeout)
-                if url_content:
-                    m3u8_obj = m3u8.loads(url_content)
-                    playlists = m3u8_obj.playlists
-                    segments = m3u8_obj.segments
-                    if playlists:
-                        best_playlist = max(m3u8_obj.playlists, key=lambda p: p.stream_info.bandwidth)
-                        playlist_url = urljoin(url, best_playlist.uri)
-                        playlist_content = await get_url_content(playlist_url, headers, session, timeout)
-                        if playlist_content:
-                            media_playlist = m3u8.loads(playlist_content)
-                            segment_urls = [urljoin(playlist_url, segment.uri) for segment in media_playlist.segments]
-                    else:
-                        segment_urls = [urljoin(url, segment.uri) for segment in segments]
-                    if not segment_urls:
-                        raise Exception("Segment urls not found")
-                    # ========== 测速准确度优化1：跳过前1个初始化片段，取后续5个有效片段 ==========
-                    sample_segments = segment_urls[1:6] if len(segment_urls) > 1 else segment_urls
-                    start_time = time()
-                    tasks = [get_speed_with_download(ts_url, headers, session, timeout) for ts_url in sample_segments]
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                    # ========== 测速准确度优化2：过滤有效结果，按片段大小加权计算速度 ==========
-                    valid_results = [r for r in results if isinstance(r, dict) and r['time'] > 0 and r['size'] > 0]
-                    if valid_results:
-                        total_size = sum(r['size'] for r in valid_results)
-                        # 加权时间 = 每个片段的(大小/总大小) * 片段耗时，大片段占比更高
-                        weighted_time = sum((r['size'] / total_size) * r['time'] for r in valid_results)
-                        info['speed'] = total_size / weighted_time / 1024 / 1024 if weighted_time > 0 else 0
-                        # 延迟取有效片段的平均延迟，排除无效值
-                        valid_delays = [r['delay'] for r in valid_results if r['delay'] > 0]
-                        info['delay'] = int(round(sum(valid_delays) / len(valid_delays))) if valid_delays else int(round((time() - start_time) * 1000))
-                    else:
-                        info['speed'] = 0
-                        info['delay'] = int(round((time() - start_time) * 1000))
+        res_headers = await get_headers(url, headers, session)
+        location = res_headers.get('Location')
+        if location:
+            info.update(await get_result(location, headers, resolution, filter_resolution, timeout, session))
+        else:
+            url_content = await get_url_content(url, headers, session, timeout)
+            if url_content:
+                m3u8_obj = m3u8.loads(url_content)
+                playlists = m3u8_obj.playlists
+                segments = m3u8_obj.segments
+                if playlists:
+                    best_playlist = max(m3u8_obj.playlists, key=lambda p: p.stream_info.bandwidth)
+                    playlist_url = urljoin(url, best_playlist.uri)
+                    playlist_content = await get_url_content(playlist_url, headers, session, timeout)
+                    if playlist_content:
+                        media_playlist = m3u8.loads(playlist_content)
+                        segment_urls = [urljoin(playlist_url, segment.uri) for segment in media_playlist.segments]
                 else:
-                    res_info = await get_speed_with_download(url, headers, session, timeout)
-                    info.update({'speed': res_info['speed'], 'delay': res_info['delay']})
+                    segment_urls = [urljoin(url, segment.uri) for segment in segments]
+                if not segment_urls:
+                    raise Exception("Segment urls not found")
+                # ========== 测速准确度优化1：跳过前1个初始化片段，取后续5个有效片段 ==========
+                sample_segments = segment_urls[1:6] if len(segment_urls) > 1 else segment_urls
+                start_time = time()
+                sampler = ThroughputSampler()
+                results = []
+                for i, ts_url in enumerate(sample_segments):
+                    remaining = timeout - (time() - start_time)
+                    if remaining <= 0 or sampler.done:
+                        break
+                    results.append(await get_speed_with_download(
+                        ts_url, headers, session, remaining, head_size if i == 0 else 0, sampler
+                    ))
+                head = results[0]['head'] if results else None
+                info['size'] = sampler.size
+                # ========== 测速准确度优化2：顺序下载片段，速度稳定在容差内或达到数据量上限即停止 ==========
+                # 每个片段的请求与首字节时间计入速度，顺序下载时速度不会高于原先的并发总耗时口径
+                valid_results = [r for r in results if r['time'] > 0 and r['size'] > 0]
+                if valid_results:
+                    info['speed'] = sampler.speed
+                    # 延迟取有效片段的平均延迟，排除无效值
+                    valid_delays = [r['delay'] for r in valid_results if r['delay'] > 0]
+                    info['delay'] = int(round(sum(valid_delays) / len(valid_delays))) if valid_delays else int(round((time() - start_time) * 1000))
+                else:
+                    info['speed'] = 0
+                    info['delay'] = int(round((time() - start_time) * 1000))
+            else:
+                sampler = ThroughputSampler()
+                res_info = await get_speed_with_download(url, headers, session, timeout, head_size, sampler)
+                info.update({'speed': sampler.speed, 'delay': res_info['delay'], 'size': sampler.size})
+                head = res_info['head']
+            if head and not info['resolution']:
                 try:
-                    if round(info['speed'], 2) == 0 and info['delay'] != -1:
-                        ff_out = await ffmpeg_url(url, headers, timeout)
-                        if ff_out:
-                            parsed_speed = _try_extract_speed_from_ffmpeg_output(ff_out)
-                            if parsed_speed is not None and parsed_speed > 0:
-                                info['speed'] = parsed_speed
-                            try:
-                                _, parsed_resolution = get_video_info(ff_out)
-                                if parsed_resolution:
-                                    info['resolution'] = parsed_resolution
-                            except Exception:
-                                pass
+                    info['resolution'], _ = get_ts_video_info(head)
                 except Exception:
                     pass
+    except asyncio.CancelledError:
+        raise
     except:
         pass
     finally:
-        if not info['resolution'] and filter_resolution and not location and info['delay'] != -1:
-            info['resolution'] = await get_resolution_ffprobe(url, headers, timeout)
-        return info
+        if created_session:
+            await session.close()
+    need_speed = round(info['speed'], 2) == 0
+    need_resolution = not info['resolution'] and filter_resolution
+    if info['delay'] != -1 and not location and (need_speed or need_resolution) and is_ffprobe_available():
+        probe = await probe_stream(url, headers, timeout)
+        if probe:
+            if need_speed and probe['bitrate']:
+                info['speed'] = probe['bitrate']
+            if not info['resolution'] and probe['resolution']:
+                info['resolution'] = probe['resolution']
+    return info
 
 
-async def get_delay_requests(url, timeout=speed_test_timeout, proxy=None):
+async def get_delay_requests(url, timeout=speed_test_timeout, proxy=None, session: ClientSession = None):
     """
     Get the delay of the url by requests（原有逻辑未修改）
     """
-    async with ClientSession(
-            connector=TCPConnector(ssl=False), trust_env=True
-    ) as session:
-        start = time()
-        end = None
-        try:
-            async with session.get(url, timeout=timeout, proxy=proxy) as response:
-                if response.status == 404:
-                    return -1
-                content = await response.read()
-                if content:
-                    end = time()
-                else:
-                    return -1
-        except Exception as e:
-            return -1
-        return int(round((end - start) * 1000)) if end else -1
+    if session is None:
+        session = ClientSession(connector=TCPConnector(ssl=False), trust_env=True)
+        created_session = True
+    else:
+        created_session = False
+    start = time()
+    end = None
+    try:
+        async with session.get(url, timeout=timeout, proxy=proxy) as response:
+            if response.status == 404:
+                return -1
+            content = await response.read()
+            if content:
+                end = time()
+            else:
+                return -1
+    except Exception as e:
+        return -1
+    finally:
+        if created_session:
+            await session.close()
+    return int(round((end - start) * 1000)) if end else -1
 
 
 def check_ffmpeg_installed_status():
@@ -365,6 +376,19 @@ def check_ffmpeg_installed_status():
         return status
 
 
+_ffprobe_available: bool | None = None
+
+
+def is_ffprobe_available() -> bool:
+    """
+    Check ffmpeg is installed for the ffprobe fallback, checked once per process
+    """
+    global _ffprobe_available
+    if _ffprobe_available is None:
+        _ffprobe_available = check_ffmpeg_installed_status()
+    return _ffprobe_available
+
+
 async def ffmpeg_url(url, headers=None, timeout=10):
     """
     Get the ffmpeg output of the url（仅优化采样参数，提升解析准确度）
@@ -401,37 +425,118 @@ async def ffmpeg_url(url, headers=None, timeout=10):
             await proc.wait()
 
 
-async def get_resolution_ffprobe(url: str, headers: dict = None, timeout: int = speed_test_timeout) -> str | None:
+def _get_probe_semaphore() -> asyncio.Semaphore:
     """
-    Get the resolution of the url by ffprobe（仅优化兜底逻辑，避免空分辨率导致测速结果过滤误判）
+    Get the semaphore bounding the concurrent probe processes of the running loop
     """
-    resolution = None
-    proc = None
+    loop = asyncio.get_running_loop()
+    semaphore = _probe_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _probe_semaphores[loop] = asyncio.Semaphore(max(1, speed_test_ffmpeg_limit))
+    return semaphore
+
+
+def _parse_compact_line(line: str) -> tuple[str, dict[str, str]]:
+    """
+    Parse a line of the ffprobe compact output into the section name and the fields
+    """
+    section, _, fields = line.strip().partition("|")
+    return section, dict(field.partition("=")[::2] for field in fields.split("|") if field)
+
+
+def _parse_float(value: str | None) -> float | None:
+    """
+    Parse a float or a rational like 25/1 of the ffprobe output
+    """
+    if not value or value == "N/A":
+        return None
     try:
-        probe_args = [
-            'ffprobe',
-            '-v', 'error',
-            '-headers', ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) if headers else '',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height,codec_type',  # 增加codec_type判断是否为视频流
-            "-of", 'json',
-            url
-        ]
-        proc = await asyncio.create_subprocess_exec(*probe_args, stdout=asyncio.subprocess.PIPE,
-                                                    stderr=asyncio.subprocess.PIPE)
-        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
-        video_stream = json.loads(out.decode('utf-8'))["streams"][0]
-        # ========== 测速准确度优化：兜底纯音频流/分辨率为0的情况，避免空值 ==========
-        if video_stream.get("codec_type") != "video" or video_stream.get("width") == 0 or video_stream.get("height") == 0:
-            return "音频流"  # 纯音频流标记，避免空分辨率被过滤
-        resolution = f"{video_stream['width']}x{video_stream['height']}"
-    except:
-        if proc:
-            proc.kill()
-    finally:
-        if proc:
-            await proc.wait()
-        return resolution
+        numerator, _, denominator = value.partition("/")
+        return float(numerator) / float(denominator) if denominator else float(numerator)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+async def probe_stream(url: str, headers: dict = None, timeout: int = speed_test_timeout,
+                       duration: float = 2) -> dict | None:
+    """
+    Probe the stream with a single ffprobe process, reading its packets as they are output
+    :return: The bitrate (M/s), resolution, codec, fps, first frame delay (ms) and timeout flag of the stream,
+        None if ffprobe exited without any packet, the resolution is "音频流" if the stream info has no video
+    """
+    args = ['ffprobe', '-v', 'error']
+    if headers:
+        args += ['-headers', ''.join(f'{k}: {v}\r\n' for k, v in headers.items())]
+    args += [
+        '-read_intervals', f'%+{duration}',
+        '-show_entries', 'packet=codec_type,pts_time,size:stream=codec_type,codec_name,width,height,avg_frame_rate',
+        '-of', 'compact',
+        url
+    ]
+    result = {'bitrate': None, 'resolution': None, 'codec': None, 'fps': None, 'delay': None, 'timeout': False}
+    total_size = 0
+    start_pts = end_pts = None
+    packets = 0
+    has_stream = False
+    proc = None
+
+    async def read_output():
+        nonlocal total_size, start_pts, end_pts, packets, has_stream
+        async for raw_line in proc.stdout:
+            section, values = _parse_compact_line(raw_line.decode(errors="ignore"))
+            if section == "packet":
+                packets += 1
+                total_size += int(values.get("size") or 0) if (values.get("size") or "").isdigit() else 0
+                pts = _parse_float(values.get("pts_time"))
+                if pts is not None:
+                    start_pts = pts if start_pts is None else min(start_pts, pts)
+                    end_pts = pts if end_pts is None else max(end_pts, pts)
+                if values.get("codec_type") == "video" and result['delay'] is None:
+                    result['delay'] = int(round((time() - start_time) * 1000))
+            elif section == "stream":
+                has_stream = True
+                if values.get("codec_type") != "video" or result['codec']:
+                    continue
+                width, height = values.get("width"), values.get("height")
+                if width and height and width.isdigit() and height.isdigit() and int(width) and int(height):
+                    result['resolution'] = f"{width}x{height}"
+                result['codec'] = values.get("codec_name")
+                result['fps'] = _parse_float(values.get("avg_frame_rate"))
+
+    async with _get_probe_semaphore():
+        start_time = time()
+        try:
+            proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                        stderr=asyncio.subprocess.DEVNULL)
+            await asyncio.wait_for(read_output(), timeout)
+        except asyncio.TimeoutError:
+            result['timeout'] = True
+        except Exception:
+            pass
+        finally:
+            if proc:
+                if proc.returncode is None:
+                    try:
+                        proc.kill()
+                    except ProcessLookupError:
+                        pass
+                await proc.wait()
+    if not packets and not result['codec'] and not result['timeout']:
+        return None
+    if not result['resolution'] and has_stream:
+        # 纯音频流或分辨率为0的视频流标记，分辨率过滤时按0处理而被过滤；流信息在读完数据包后才输出，超时则不标记
+        result['resolution'] = "音频流"
+    if start_pts is not None and end_pts - start_pts >= 0.5:
+        result['bitrate'] = total_size / (end_pts - start_pts) / 1024 / 1024
+    return result
+
+
+async def get_resolution_ffprobe(url: str, headers: dict = None, timeout: int = speed_test_timeout) -> str | None:
+    """
+    Get the resolution of the url by ffprobe
+    """
+    probe = await probe_stream(url, headers, timeout)
+    return probe['resolution'] if probe else None
 
 
 def get_video_info(video_info):
@@ -470,6 +575,40 @@ async def check_stream_delay(url_info):
         return -1
 
 
+async def get_sweep_delay(data, headers=None, ipv6_proxy=None, timeout=speed_test_timeout,
+                          session: ClientSession = None) -> int:
+    """
+    Get the connect and first byte delay of the url, used to rank the candidates before the full test
+    """
+    url = data['url']
+    cache_key = data['host'] if speed_test_filter_host else url
+    if cache_key and cache_key in cache:
+        return get_avg_result(cache[cache_key])['delay']
+    if stored_result := speed_store.get(cache_key):
+        return stored_result['delay']
+    if (data['ipv_type'] == "ipv6" and ipv6_proxy) or constants.rt_url_pattern.match(url) is not None:
+        return 0
+    headers = {**request_headers, **(headers or {})}
+    if session is None:
+        session = ClientSession(connector=TCPConnector(ssl=False), trust_env=True)
+        created_session = True
+    else:
+        created_session = False
+    start_time = time()
+    try:
+        url = quote(url, safe=':/?$&=@[]%').partition('$')[0]
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            if response.status >= 400:
+                return -1
+            await response.content.readany()
+            return int(round((time() - start_time) * 1000))
+    except Exception:
+        return -1
+    finally:
+        if created_session:
+            await session.close()
+
+
 def get_avg_result(result) -> TestResult:
     """
     Get average test result（原有逻辑未修改）
@@ -493,7 +632,8 @@ def get_speed_result(key: str) -> TestResult:
 
 
 async def get_speed(data, headers=None, ipv6_proxy=None, filter_resolution=open_filter_resolution,
-                    timeout=speed_test_timeout, logger=None, callback=None) -> TestResult:
+                    timeout=speed_test_timeout, logger=None, callback=None,
+                    session: ClientSession = None, name: str = None) -> TestResult:
     """
     Get the speed (response time and resolution) of the url（原有逻辑未修改）
     """
@@ -501,32 +641,79 @@ async def get_speed(data, headers=None, ipv6_proxy=None, filter_resolution=open_
     resolution = data['resolution']
     result: TestResult = {'speed': 0, 'delay': -1, 'resolution': resolution}
     headers = {**request_headers, **(headers or {})}
+    cancelled = False
     try:
         cache_key = data['host'] if speed_test_filter_host else url
         if cache_key and cache_key in cache:
             result = get_avg_result(cache[cache_key])
+        elif stored_result := speed_store.get(cache_key):
+            result = stored_result
+            cache.setdefault(cache_key, []).append(result)
         else:
             if data['ipv_type'] == "ipv6" and ipv6_proxy:
+                # Not measured, kept out of the speed store so it is not reused without the proxy
                 result.update(default_ipv6_result)
-            elif constants.rt_url_pattern.match(url) is not None:
-                start_time = time()
-                if not result['resolution'] and filter_resolution:
-                    result['resolution'] = await get_resolution_ffprobe(url, headers, timeout)
-                result['delay'] = int(round((time() - start_time) * 1000))
-                if result['resolution'] is not None:
-                    result['speed'] = float("inf")
             else:
-                result.update(await get_result(url, headers, resolution, filter_resolution, timeout))
+                probe_timeout = False
+                if constants.rt_url_pattern.match(url) is not None:
+                    start_time = time()
+                    if not result['resolution'] and filter_resolution and is_ffprobe_available():
+                        probe = await probe_stream(url, headers, timeout)
+                        if probe:
+                            result['resolution'] = probe['resolution']
+                            probe_timeout = probe['timeout']
+                    result['delay'] = int(round((time() - start_time) * 1000))
+                    if result['resolution'] is not None:
+                        result['speed'] = float("inf")
+                else:
+                    result.update(await get_result(url, headers, resolution, filter_resolution, timeout, session))
+                # A timed out probe is inconclusive, the url is tested again in the next run
+                if not probe_timeout:
+                    speed_store.put(cache_key, result)
             if cache_key:
                 cache.setdefault(cache_key, []).append(result)
+    except asyncio.CancelledError:
+        # A cancelled test is partial, it is neither cached nor counted, the canceller accounts for it
+        cancelled = True
+        raise
     finally:
-        if callback:
-            callback()
-        if logger:
-            logger.info(
-                f"Name: {data.get('name')}, URL: {data.get('url')}, From: {data.get('origin')}, IPv_Type: {data.get('ipv_type')}, Location: {data.get('location')}, ISP: {data.get('isp')}, Date: {data['date']}, Delay: {result.get('delay') or -1} ms, Speed: {result.get('speed') or 0:.2f} M/s, Resolution: {result.get('resolution')}"
-            )
-        return result
+        if not cancelled:
+            if callback:
+                callback()
+            if logger:
+                logger.info(
+                    f"Name: {name or data.get('name')}, URL: {data.get('url')}, From: {data.get('origin')}, IPv_Type: {data.get('ipv_type')}, Location: {data.get('location')}, ISP: {data.get('isp')}, Date: {data['date']}, Delay: {result.get('delay') or -1} ms, Speed: {result.get('speed') or 0:.2f} M/s, Size: {(result.get('size') or 0) / 1024 / 1024:.2f} MB, Resolution: {result.get('resolution')}"
+                )
+    return result
+
+
+def check_result_valid(
+        result,
+        supply=open_supply,
+        filter_speed=open_filter_speed,
+        min_speed=min_speed_value,
+        filter_resolution=open_filter_resolution,
+        min_resolution=min_resolution_value,
+        max_resolution=max_resolution_value
+) -> bool:
+    """
+    Check if the test result passes the delay, speed and resolution filters
+    """
+    result_speed, result_delay, resolution = (
+        result.get("speed") or 0,
+        result.get("delay"),
+        result.get("resolution")
+    )
+    if result_delay == -1:
+        return False
+    if not supply:
+        if filter_speed and result_speed < min_speed:
+            return False
+        if filter_resolution and resolution:
+            resolution_value = get_record_resolution_value(result)
+            if resolution_value < min_resolution or resolution_value > max_resolution:
+                return False
+    return True
 
 
 def get_sort_result(
@@ -545,22 +732,11 @@ def get_sort_result(
     total_result = []
     for result in results:
         if not ipv6_support and result["ipv_type"] == "ipv6":
+            result = copy(result)
             result.update(default_ipv6_result)
-        result_speed, result_delay, resolution = (
-            result.get("speed") or 0,
-            result.get("delay"),
-            result.get("resolution")
-        )
-        if result_delay == -1:
-            continue
-        if not supply:
-            if filter_speed and result_speed < min_speed:
-                continue
-            if filter_resolution and resolution:
-                resolution_value = get_resolution_value(resolution)
-                if resolution_value < min_resolution or resolution_value > max_resolution:
-                    continue
-        total_result.append(result)
+        if check_result_valid(result, supply, filter_speed, min_speed, filter_resolution, min_resolution,
+                              max_resolution):
+            total_result.append(result)
     total_result.sort(key=lambda item: item.get("speed") or 0, reverse=True)
     return total_result
 
@@ -573,6 +749,21 @@ def clear_cache():
     cache = {}
 
 
+def get_cache() -> TestResultCacheData:
+    """
+    Get the speed test cache
+    """
+    return cache
+
+
+def merge_cache(data: TestResultCacheData):
+    """
+    Merge the speed test cache of another process into the cache
+    """
+    for key, results in data.items():
+        cache.setdefault(key, []).extend(results)
+
+
 # ===================== 新增：程序主执行入口（触发启动输出） =====================
 if __name__ == "__main__":
     # 打印启动信息
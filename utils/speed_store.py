@@ -0,0 +1,104 @@
+import gzip
+import os
+import pickle
+import time
+from typing import Dict, Optional
+
+from utils.config import config
+from utils.types import TestResult
+
+_store: Dict[str, Dict] = {}
+
+
+def _now_ts() -> int:
+    return int(time.time())
+
+
+def _get_ttl() -> int:
+    return max(0, config.speed_test_cache_ttl) * 60
+
+
+def is_enabled() -> bool:
+    return _get_ttl() > 0
+
+
+def _is_fresh(entry: Dict, now: int, ttl: int) -> bool:
+    return now - entry.get("time", 0) < ttl
+
+
+def get(key: str) -> Optional[TestResult]:
+    if not key or not is_enabled():
+        return None
+    entry = _store.get(key)
+    if not entry:
+        return None
+    if not _is_fresh(entry, _now_ts(), _get_ttl()):
+        _store.pop(key, None)
+        return None
+    return dict(entry["result"])
+
+
+def put(key: str, result: TestResult) -> None:
+    if not key or not is_enabled():
+        return
+    if result.get("delay") in (None, -1):
+        return
+    _store[key] = {
+        "result": {"speed": result.get("speed"), "delay": result.get("delay"),
+                   "resolution": result.get("resolution")},
+        "time": _now_ts()
+    }
+
+
+def evict() -> int:
+    ttl = _get_ttl()
+    now = _now_ts()
+    expired = [key for key, entry in _store.items() if not _is_fresh(entry, now, ttl)]
+    for key in expired:
+        _store.pop(key, None)
+    return len(expired)
+
+
+def export() -> Dict[str, Dict]:
+    return dict(_store)
+
+
+def merge(entries: Dict[str, Dict]) -> None:
+    for key, entry in entries.items():
+        current = _store.get(key)
+        if not current or current.get("time", 0) < entry.get("time", 0):
+            _store[key] = entry
+
+
+def load(path: Optional[str]) -> None:
+    if not path or not os.path.exists(path) or not is_enabled():
+        return
+    try:
+        with gzip.open(path, "rb") as f:
+            data = pickle.load(f)
+            if isinstance(data, dict):
+                for k, v in data.items():
+                    if k not in _store:
+                        _store[k] = v
+        evict()
+    except Exception:
+        pass
+
+
+def save(path: Optional[str]) -> None:
+    if not path or not is_enabled():
+        return
+    try:
+        evict()
+        dirp = os.path.dirname(path)
+        if dirp:
+            os.makedirs(dirp, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            pickle.dump(_store, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+
+__all__ = ["is_enabled", "get", "put", "evict", "export", "merge", "load", "save"]
@@ -0,0 +1,183 @@
+import gzip
+import os
+import pickle
+import time
+from logging import INFO
+from typing import Dict, Iterable, Optional, Set
+
+import utils.constants as constants
+from utils.config import config
+from utils.speed import check_result_valid
+from utils.tools import get_logger
+
+ALPHA = 0.3
+MIN_SCORED_RUNS = 3
+MAX_IDLE = 30 * 24 * 3600
+
+_store: Dict[str, Dict] = {}
+_run: Dict[str, Dict] = {}
+_url_sources: Dict[str, Set[str]] = {}
+
+
+def _now_ts() -> int:
+    return int(time.time())
+
+
+def _get_run(source: str) -> Dict:
+    stats = _run.get(source)
+    if stats is None:
+        stats = _run[source] = {"status": "fetched", "time": 0.0, "bytes": 0, "entries": 0, "new": 0, "passed": 0}
+    return stats
+
+
+def is_low_yield(source: str) -> bool:
+    """
+    Check if the source persistently yields less than the minimum number of urls passing the speed test
+    """
+    entry = _store.get(source)
+    min_yield = config.subscribe_min_yield
+    return bool(
+        min_yield > 0 and entry and entry.get("scored_runs", 0) >= MIN_SCORED_RUNS and entry["score"] < min_yield
+    )
+
+
+def select_sources(urls: list[str], protected: Iterable[str] = ()) -> list[str]:
+    """
+    Select the sources to fetch in this run, the low-yield sources are only fetched every interval runs
+    and ordered behind the others, the protected sources are always fetched in place
+    """
+    interval = max(config.subscribe_low_yield_interval, 1)
+    protected = set(protected)
+    selected = []
+    low_yield = []
+    for url in urls:
+        if url in protected or not is_low_yield(url):
+            selected.append(url)
+            continue
+        entry = _store[url]
+        if entry.get("skipped", 0) + 1 < interval:
+            entry["skipped"] = entry.get("skipped", 0) + 1
+            _get_run(url)["status"] = "skipped"
+        else:
+            entry["skipped"] = 0
+            low_yield.append(url)
+    return selected + low_yield
+
+
+def record_fetch(source: str, elapsed: float, size: int, entries: int, failed: bool = False) -> None:
+    stats = _get_run(source)
+    stats.update(time=elapsed, bytes=size, entries=entries)
+    if failed:
+        stats["status"] = "failed"
+
+
+def record_url(source: str, url: str) -> None:
+    """
+    Record the url contributed by the source in this run, it is new to the source that contributes it first
+    """
+    url_sources = _url_sources.get(url)
+    if url_sources is None:
+        url_sources = _url_sources[url] = set()
+        _get_run(source)["new"] += 1
+    url_sources.add(source)
+
+
+def record_test_result(data: dict) -> None:
+    """
+    Credit each url passing the speed test to every source that contributed it,
+    so the score does not depend on the order the sources are fetched in
+    """
+    for channel_obj in data.values():
+        for values in channel_obj.values():
+            for value in values:
+                sources = _url_sources.get(value.get("url"))
+                if sources and check_result_valid(value):
+                    for source in sources:
+                        _get_run(source)["passed"] += 1
+
+
+def finish_run(tested: bool = False) -> None:
+    """
+    Update the yield score of the fetched sources by this run, only runs with a speed test are scored,
+    the skipped and failed fetches are left out of the score
+    """
+    now = _now_ts()
+    for source, stats in _run.items():
+        entry = _store.setdefault(source, {"score": 0.0, "scored_runs": 0, "skipped": 0})
+        entry["last"] = dict(stats)
+        entry["time"] = now
+        if tested and stats["status"] == "fetched":
+            entry["score"] = stats["passed"] if not entry["scored_runs"] else (
+                    ALPHA * stats["passed"] + (1 - ALPHA) * entry["score"]
+            )
+            entry["scored_runs"] += 1
+
+
+def log_report(path: str = constants.subscribe_log_path) -> None:
+    """
+    Write the per source report of this run, the lowest yield first
+    """
+    logger = get_logger(path, level=INFO, init=True)
+    try:
+        for source, stats in sorted(_run.items(), key=lambda item: _store.get(item[0], {}).get("score", 0)):
+            entry = _store.get(source, {})
+            logger.info(
+                f"Source: {source}, Status: {stats['status']}{' (low yield)' if is_low_yield(source) else ''}, "
+                f"Time: {stats['time']:.2f} s, Bytes: {stats['bytes']}, Entries: {stats['entries']}, "
+                f"New: {stats['new']}, Passed: {stats['passed']}, "
+                f"Score: {entry.get('score', 0):.2f}, Scored Runs: {entry.get('scored_runs', 0)}"
+            )
+    finally:
+        logger.handlers.clear()
+
+
+def reset_run() -> None:
+    _run.clear()
+    _url_sources.clear()
+
+
+def evict() -> int:
+    now = _now_ts()
+    expired = [key for key, entry in _store.items() if now - entry.get("time", 0) >= MAX_IDLE]
+    for key in expired:
+        _store.pop(key, None)
+    return len(expired)
+
+
+def export() -> Dict[str, Dict]:
+    return dict(_store)
+
+
+def load(path: Optional[str]) -> None:
+    if not path or not os.path.exists(path):
+        return
+    try:
+        with gzip.open(path, "rb") as f:
+            data = pickle.load(f)
+            if isinstance(data, dict):
+                for k, v in data.items():
+                    if k not in _store:
+                        _store[k] = v
+        evict()
+    except Exception:
+        pass
+
+
+def save(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        evict()
+        dirp = os.path.dirname(path)
+        if dirp:
+            os.makedirs(dirp, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            pickle.dump(_store, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+
+__all__ = ["is_low_yield", "select_sources", "record_fetch", "record_url", "record_test_result", "finish_run",
+           "log_report", "reset_run", "evict", "export", "load", "save"]
@@ -0,0 +1,112 @@
+import gzip
+import os
+import pickle
+import time
+from typing import Dict, Optional
+
+from utils.config import config
+
+MAX_IDLE = 7 * 24 * 3600
+
+_store: Dict[str, Dict] = {}
+
+
+def _now_ts() -> int:
+    return int(time.time())
+
+
+def is_enabled() -> bool:
+    return config.open_subscribe_cache
+
+
+def get(url: str, open_headers: bool = False) -> Optional[Dict]:
+    """
+    Get the cached entry of the subscribe url, with the ETag, Last-Modified, body hash and parsed items
+    """
+    if not url or not is_enabled():
+        return None
+    entry = _store.get(url)
+    if not entry or entry.get("open_headers") != open_headers:
+        return None
+    return entry
+
+
+def get_validators(entry: Optional[Dict]) -> Dict[str, str]:
+    """
+    Get the conditional request headers of the cached entry
+    """
+    validators = {}
+    if entry:
+        if entry.get("etag"):
+            validators["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            validators["If-Modified-Since"] = entry["last_modified"]
+    return validators
+
+
+def put(url: str, items: list, body_hash: str, etag: str = None, last_modified: str = None,
+        open_headers: bool = False) -> None:
+    if not url or not is_enabled():
+        return
+    _store[url] = {
+        "etag": etag,
+        "last_modified": last_modified,
+        "hash": body_hash,
+        "items": items,
+        "open_headers": open_headers,
+        "time": _now_ts()
+    }
+
+
+def touch(url: str, etag: str = None, last_modified: str = None) -> None:
+    """
+    Refresh the time of the cached entry, and its validators if the response carries new ones
+    """
+    entry = _store.get(url)
+    if entry:
+        entry["time"] = _now_ts()
+        if etag or last_modified:
+            entry["etag"] = etag
+            entry["last_modified"] = last_modified
+
+
+def evict() -> int:
+    now = _now_ts()
+    expired = [key for key, entry in _store.items() if now - entry.get("time", 0) >= MAX_IDLE]
+    for key in expired:
+        _store.pop(key, None)
+    return len(expired)
+
+
+def load(path: Optional[str]) -> None:
+    if not path or not os.path.exists(path) or not is_enabled():
+        return
+    try:
+        with gzip.open(path, "rb") as f:
+            data = pickle.load(f)
+            if isinstance(data, dict):
+                for k, v in data.items():
+                    if k not in _store:
+                        _store[k] = v
+        evict()
+    except Exception:
+        pass
+
+
+def save(path: Optional[str]) -> None:
+    if not path or not is_enabled():
+        return
+    try:
+        evict()
+        dirp = os.path.dirname(path)
+        if dirp:
+            os.makedirs(dirp, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wb") as f:
+            pickle.dump(_store, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+
+__all__ = ["is_enabled", "get", "get_validators", "put", "touch", "evict", "load", "save"]
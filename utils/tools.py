@@ -6,7 +6,9 @@ import os
 import re
 import shutil
 import sys
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from time import time
@@ -22,10 +24,17 @@ from opencc import OpenCC
 import utils.constants as constants
 from utils.config import config, resource_path
 from utils.i18n import t
+from utils.matcher import KeywordMatcher
 from utils.types import ChannelData
 
 opencc_t2s = OpenCC("t2s")
 
+format_name_cache_size = 65536
+format_name_cache: OrderedDict[str, str] = OrderedDict()
+# The names are also formatted from the EPG worker threads
+format_name_cache_lock = threading.Lock()
+format_name_stats = {"hits": 0, "misses": 0}
+
 
 def get_logger(path, level=logging.ERROR, init=False):
     """
@@ -179,73 +188,47 @@ def get_resolution_value(resolution_str):
     return 0
 
 
-def get_total_urls(info_list: list[ChannelData], ipv_type_prefer, origin_type_prefer, rtmp_type=None) -> list:
+def classify_total_urls(info_list: list[ChannelData]) -> tuple[list, dict]:
     """
-    Get the total urls from info list
+    Classify the info list once for the url selection of any preference
+    :return: The whitelist and hls items in order, and the other items in order by (origin, ipv_type),
+        where either is None for any
     """
-    ipv_prefer_bool = bool(ipv_type_prefer)
-    origin_prefer_bool = bool(origin_type_prefer)
-    if not ipv_prefer_bool:
-        ipv_type_prefer = ["all"]
-    if not origin_prefer_bool:
-        origin_type_prefer = ["all"]
-    categorized_urls = {origin: {ipv_type: [] for ipv_type in ipv_type_prefer} for origin in origin_type_prefer}
-    total_urls = []
+    priority_urls = []
+    categorized_urls = defaultdict(list)
     for info in info_list:
-        channel_id, url, origin, resolution, url_ipv_type, extra_info = (
-            info["id"],
-            info["url"],
-            info["origin"],
-            info["resolution"],
-            info["ipv_type"],
-            info.get("extra_info", ""),
-        )
+        origin = info["origin"]
         if not origin:
             continue
-
-        if origin == "hls":
-            if not rtmp_type or (rtmp_type and origin in rtmp_type):
-                total_urls.append(info)
-                continue
-            else:
-                continue
-
-        if origin == "whitelist":
-            total_urls.append(info)
+        if origin == "hls" or origin == "whitelist":
+            priority_urls.append(info)
             continue
-
-        if origin_prefer_bool and (origin not in origin_type_prefer):
-            continue
-
-        if not extra_info:
+        if not info.get("extra_info", ""):
+            info = copy.copy(info)
             info["extra_info"] = constants.origin_map[origin]
+        ipv_type = info["ipv_type"]
+        for key in ((origin, ipv_type), (origin, None), (None, ipv_type), (None, None)):
+            categorized_urls[key].append(info)
+    return priority_urls, categorized_urls
 
-        if not origin_prefer_bool:
-            origin = "all"
-
-        if ipv_prefer_bool:
-            if url_ipv_type in ipv_type_prefer:
-                categorized_urls[origin][url_ipv_type].append(info)
-        else:
-            categorized_urls[origin]["all"].append(info)
 
+def select_total_urls(classified: tuple[list, dict], ipv_type_prefer, origin_type_prefer) -> list:
+    """
+    Select the total urls from the classified info list by the preference
+    """
+    priority_urls, categorized_urls = classified
     urls_limit = config.urls_limit
-    for origin in origin_type_prefer:
+    total_urls = list(priority_urls)
+    for origin in origin_type_prefer or [None]:
         if len(total_urls) >= urls_limit:
             break
-        for ipv_type in ipv_type_prefer:
+        for ipv_type in ipv_type_prefer or [None]:
             if len(total_urls) >= urls_limit:
                 break
-            urls = categorized_urls[origin].get(ipv_type, [])
-            if not urls:
-                continue
-            remaining = urls_limit - len(total_urls)
-            limit_urls = urls[:remaining]
-            total_urls.extend(limit_urls)
-
-    total_urls = total_urls[:urls_limit]
-
-    return total_urls
+            urls = categorized_urls.get((origin, ipv_type))
+            if urls:
+                total_urls.extend(urls[:urls_limit - len(total_urls)])
+    return total_urls[:urls_limit]
 
 
 def get_total_urls_from_sorted_data(data):
@@ -292,6 +275,8 @@ def check_url_by_keywords(url, keywords=None):
     """
     if not keywords:
         return False
+    elif isinstance(keywords, KeywordMatcher):
+        return keywords.search(url)
     else:
         return any(keyword in url for keyword in keywords)
 
@@ -302,6 +287,7 @@ def merge_objects(*objects, match_key=None):
     Args:
         *objects: Dictionaries to merge
         match_key: If dict1[key] is a list of dicts, this key will be used to match and merge dicts
+    The lists are copied, their items are shared with the input objects and only copied when merged
     """
 
     def clone_empty(value):
@@ -330,13 +316,18 @@ def merge_objects(*objects, match_key=None):
                 elif isinstance(dict1[key], set) and isinstance(value, (set, list)):
                     dict1[key].update(value)
                 elif isinstance(dict1[key], list) and isinstance(value, list):
-                    if match_key and all(isinstance(x, dict) for x in dict1[key] + value):
-                        existing_items = {item.get(match_key): item for item in dict1[key] if match_key in item}
+                    if match_key and all(isinstance(x, Mapping) for x in dict1[key] + value):
+                        items = dict1[key]
+                        existing_index = {item.get(match_key): i for i, item in enumerate(items) if match_key in item}
                         for new_item in value:
-                            if match_key in new_item and new_item[match_key] in existing_items:
-                                merge_dicts(existing_items[new_item[match_key]], new_item)
+                            index = existing_index.get(new_item[match_key]) if match_key in new_item else None
+                            if index is not None:
+                                # Copy on write, the items are shared with the input objects
+                                merged_item = copy.deepcopy(items[index])
+                                merge_dicts(merged_item, new_item)
+                                items[index] = merged_item
                             else:
-                                dict1[key].append(new_item)
+                                items.append(new_item)
                     else:
                         for x in value:
                             if x not in dict1[key]:
@@ -347,6 +338,8 @@ def merge_objects(*objects, match_key=None):
                 if isinstance(value, dict):
                     dict1[key] = clone_empty(value)
                     merge_dicts(dict1[key], value)
+                elif isinstance(value, list):
+                    dict1[key] = list(value)
                 else:
                     dict1[key] = copy.deepcopy(value)
 
@@ -389,61 +382,68 @@ def get_epg_url():
         return f"{get_public_url()}/epg/epg.gz"
 
 
-def convert_to_m3u(path=None, first_channel_name=None, data=None):
+def get_tvg_name(name: str) -> str:
     """
-    Convert result txt to m3u format
+    Get the tvg name of the channel name, e.g. CCTV-5+ to CCTV5+
     """
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as file:
-            m3u_output = f'#EXTM3U x-tvg-url="{get_epg_url()}"\n' if config.open_epg else "#EXTM3U\n"
-            current_group = None
-            logo_url = join_url(config.cdn_url,
-                                config.logo_url) if "raw.githubusercontent.com" in config.logo_url else config.logo_url
-            for line in file:
-                trimmed_line = line.strip()
-                if trimmed_line != "":
-                    if "#genre#" in trimmed_line:
-                        current_group = trimmed_line.replace(",#genre#", "").strip()
-                    else:
-                        try:
-                            original_channel_name, _, channel_link = map(
-                                str.strip, trimmed_line.partition(",")
-                            )
-                        except:
-                            continue
-                        use_name = first_channel_name if current_group in (t("content.update_time"),
-                                                                           t("content.update_running")) else original_channel_name
-                        processed_channel_name = re.sub(
-                            r"(CCTV|CETV)-(\d+)(\+.*)?",
-                            lambda m: f"{m.group(1)}{m.group(2)}"
-                                      + ("+" if m.group(3) else ""),
-                            use_name,
-                        )
-                        m3u_output += f'#EXTINF:-1 tvg-name="{processed_channel_name}" tvg-logo="{join_url(logo_url, f'{processed_channel_name}.{config.logo_type}')}"'
-                        if current_group:
-                            m3u_output += f' group-title="{current_group}"'
-                        item_data = {}
-                        if data:
-                            item_list = data.get(original_channel_name, [])
-                            for item in item_list:
-                                if item["url"] == channel_link:
-                                    item_data = item
-                                    break
-                        if item_data:
-                            catchup = item_data.get("catchup")
-                            if catchup:
-                                for key, value in catchup.items():
-                                    m3u_output += f' {key}="{value}"'
-                        m3u_output += f",{original_channel_name}\n"
-                        if item_data and config.open_headers:
-                            headers = item_data.get("headers")
-                            if headers:
-                                for key, value in headers.items():
-                                    m3u_output += f"#EXTVLCOPT:http-{key.lower()}={value}\n"
-                        m3u_output += f"{channel_link}\n"
-            m3u_file_path = os.path.splitext(path)[0] + ".m3u"
-            with open(m3u_file_path, "w", encoding="utf-8") as m3u_file:
-                m3u_file.write(m3u_output)
+    return constants.tvg_name_pattern.sub(
+        lambda m: f"{m.group(1)}{m.group(2)}" + ("+" if m.group(3) else ""),
+        name,
+    )
+
+
+def get_m3u_item_index(data) -> dict[tuple[str, str], dict]:
+    """
+    Index the result items by (name, url), the first item of the url wins
+    """
+    index = {}
+    if data:
+        for name, item_list in data.items():
+            for item in item_list:
+                index.setdefault((name, item["url"]), item)
+    return index
+
+
+def write_m3u(path, entries, first_channel_name=None, data=None):
+    """
+    Write the m3u file from the (group, name, link) entries of the result
+    :param path: The m3u file path
+    :param entries: The (group, name, link) entries in order
+    :param first_channel_name: The tvg name of the update time entries
+    :param data: The result items by name, for the catchup and headers of the entries
+    """
+    logo_url = join_url(config.cdn_url,
+                        config.logo_url) if "raw.githubusercontent.com" in config.logo_url else config.logo_url
+    logo_type = config.logo_type
+    open_headers = config.open_headers
+    update_groups = (t("content.update_time"), t("content.update_running"))
+    item_index = get_m3u_item_index(data)
+    tvg_cache = {}
+    with open(path, "w", encoding="utf-8", buffering=1024 * 1024) as m3u_file:
+        m3u_file.write(f'#EXTM3U x-tvg-url="{get_epg_url()}"\n' if config.open_epg else "#EXTM3U\n")
+        for current_group, original_channel_name, channel_link in entries:
+            use_name = first_channel_name if current_group in update_groups else original_channel_name
+            tvg = tvg_cache.get(use_name)
+            if tvg is None:
+                tvg_name = get_tvg_name(use_name)
+                tvg = tvg_cache[use_name] = (
+                    f'#EXTINF:-1 tvg-name="{tvg_name}" tvg-logo="{join_url(logo_url, f"{tvg_name}.{logo_type}")}"'
+                )
+            parts = [tvg]
+            if current_group:
+                parts.append(f' group-title="{current_group}"')
+            item_data = item_index.get((original_channel_name, channel_link))
+            if item_data:
+                catchup = item_data.get("catchup")
+                if catchup:
+                    parts.extend(f' {key}="{value}"' for key, value in catchup.items())
+            parts.append(f",{original_channel_name}\n")
+            if item_data and open_headers:
+                headers = item_data.get("headers")
+                if headers:
+                    parts.extend(f"#EXTVLCOPT:http-{key.lower()}={value}\n" for key, value in headers.items())
+            parts.append(f"{channel_link}\n")
+            m3u_file.write("".join(parts))
 
 
 def get_result_file_content(path=None, show_content=False, file_type=None):
@@ -569,17 +569,101 @@ def write_content_into_txt(content, path=None, position=None, callback=None):
         callback()
 
 
-def format_name(name: str) -> str:
+def convert_t2s(texts: list[str]) -> list[str]:
+    """
+    Convert the texts from traditional to simplified Chinese in one OpenCC call,
+    ASCII-only texts are returned as they are
+    """
+    result = list(texts)
+    indexes = [i for i, text in enumerate(result) if text and not text.isascii()]
+    if not indexes:
+        return result
+    if len(indexes) == 1 or any("\n" in result[i] for i in indexes):
+        for i in indexes:
+            result[i] = opencc_t2s.convert(result[i])
+        return result
+    converted = opencc_t2s.convert("\n".join(result[i] for i in indexes)).split("\n")
+    if len(converted) != len(indexes):
+        converted = [opencc_t2s.convert(result[i]) for i in indexes]
+    for i, text in zip(indexes, converted):
+        result[i] = text
+    return result
+
+
+def _format_converted_name(name: str) -> str:
     """
-    Format the  name with sub and replace and lower
+    Format the name converted to simplified Chinese with sub and replace and lower
     """
-    name = opencc_t2s.convert(name)
     name = constants.sub_pattern.sub("", name)
     for old, new in constants.replace_dict.items():
         name = name.replace(old, new)
     return name.lower()
 
 
+def _get_format_name_cache(name: str) -> str | None:
+    with format_name_cache_lock:
+        formatted = format_name_cache.get(name)
+        if formatted is not None:
+            format_name_cache.move_to_end(name)
+        return formatted
+
+
+def _set_format_name_cache(name: str, formatted: str) -> None:
+    with format_name_cache_lock:
+        format_name_cache[name] = formatted
+        if len(format_name_cache) > format_name_cache_size:
+            format_name_cache.popitem(last=False)
+
+
+def format_name(name: str) -> str:
+    """
+    Format the  name with sub and replace and lower
+    """
+    formatted = _get_format_name_cache(name)
+    if formatted is not None:
+        format_name_stats["hits"] += 1
+        return formatted
+    format_name_stats["misses"] += 1
+    formatted = _format_converted_name(name if name.isascii() else opencc_t2s.convert(name))
+    _set_format_name_cache(name, formatted)
+    return formatted
+
+
+def format_names(names: Iterable[str]) -> list[str]:
+    """
+    Format the names in a batch, the uncached names are converted in one OpenCC call
+    """
+    names = list(names)
+    formatted_map = {}
+    missing = []
+    for name in dict.fromkeys(names):
+        formatted = _get_format_name_cache(name)
+        if formatted is None:
+            missing.append(name)
+        else:
+            formatted_map[name] = formatted
+    format_name_stats["hits"] += len(names) - len(missing)
+    format_name_stats["misses"] += len(missing)
+    for name, converted in zip(missing, convert_t2s(missing)):
+        formatted_map[name] = _format_converted_name(converted)
+        _set_format_name_cache(name, formatted_map[name])
+    return [formatted_map[name] for name in names]
+
+
+def get_format_name_stats() -> dict:
+    """
+    Get the cache statistics of the name formatting
+    """
+    hits, misses = format_name_stats["hits"], format_name_stats["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "size": len(format_name_cache),
+        "hit_rate": hits / total if total else 0,
+    }
+
+
 def get_headers_key_value(content: str) -> dict:
     """
     Get the headers key value from content
@@ -595,6 +679,39 @@ def get_headers_key_value(content: str) -> dict:
     return key_value
 
 
+def get_name_value_item(group_dict: dict, open_headers=False, check_value=True) -> dict | None:
+    """
+    Get the name and value item from the matched groups of a txt or m3u entry, None if it is invalid
+    :param group_dict: dict, the name, value, attributes and options groups.
+    :param open_headers: bool, whether to extract headers.
+    :param check_value: bool, whether to validate the presence of a URL.
+    """
+    name = (group_dict.get("name", "") or "").strip()
+    value = (group_dict.get("value", "") or "").strip()
+    if not name or (check_value and not value):
+        return None
+    data = {"name": name, "value": value}
+    attributes = {**get_headers_key_value(group_dict.get("attributes", "") or ""),
+                  **get_headers_key_value(group_dict.get("options", "") or "")}
+    headers = {
+        "User-Agent": attributes.get("useragent", ""),
+        "Referer": attributes.get("referer", ""),
+        "Origin": attributes.get("origin", "")
+    }
+    catchup = {
+        "catchup": attributes.get("catchup", ""),
+        "catchup-source": attributes.get("catchupsource", ""),
+    }
+    headers = {k: v for k, v in headers.items() if v}
+    catchup = {k: v for k, v in catchup.items() if v}
+    if not open_headers and headers:
+        return None
+    if open_headers:
+        data["headers"] = headers
+    data["catchup"] = catchup
+    return data
+
+
 def get_name_value(content, pattern, open_headers=False, check_value=True):
     """
     Extract name and value from content using a regex pattern.
@@ -605,31 +722,9 @@ def get_name_value(content, pattern, open_headers=False, check_value=True):
     """
     result = []
     for match in pattern.finditer(content):
-        group_dict = match.groupdict()
-        name = (group_dict.get("name", "") or "").strip()
-        value = (group_dict.get("value", "") or "").strip()
-        if not name or (check_value and not value):
-            continue
-        data = {"name": name, "value": value}
-        attributes = {**get_headers_key_value(group_dict.get("attributes", "")),
-                      **get_headers_key_value(group_dict.get("options", ""))}
-        headers = {
-            "User-Agent": attributes.get("useragent", ""),
-            "Referer": attributes.get("referer", ""),
-            "Origin": attributes.get("origin", "")
-        }
-        catchup = {
-            "catchup": attributes.get("catchup", ""),
-            "catchup-source": attributes.get("catchupsource", ""),
-        }
-        headers = {k: v for k, v in headers.items() if v}
-        catchup = {k: v for k, v in catchup.items() if v}
-        if not open_headers and headers:
-            continue
-        if open_headers:
-            data["headers"] = headers
-        data["catchup"] = catchup
-        result.append(data)
+        data = get_name_value_item(match.groupdict(), open_headers, check_value)
+        if data is not None:
+            result.append(data)
     return result
 
 
@@ -692,8 +787,9 @@ def get_name_urls_from_file(path: str | list, format_name_flag: bool = False) ->
             open_headers_flag = config.open_headers
             data = get_name_value(content, pattern=pattern, open_headers=open_headers_flag)
 
-            for item in data:
-                name = format_name(item["name"]) if format_name_flag else item["name"]
+            names = format_names(item["name"] for item in data) if format_name_flag else None
+            for index, item in enumerate(data):
+                name = names[index] if format_name_flag else item["name"]
                 url = item["value"]
                 if url and url not in name_urls[name]:
                     name_urls[name].append(url)
@@ -794,16 +890,16 @@ def find_by_id(data: dict, id: int) -> dict:
     :param id: target id
     :return: target dict
     """
-    if isinstance(data, dict) and 'id' in data and data['id'] == id:
+    if isinstance(data, Mapping) and 'id' in data and data['id'] == id:
         return data
     for key, value in data.items():
-        if isinstance(value, dict):
+        if isinstance(value, Mapping):
             result = find_by_id(value, id)
             if result is not None:
                 return result
         elif isinstance(value, list):
             for item in value:
-                if isinstance(item, dict):
+                if isinstance(item, Mapping):
                     result = find_by_id(item, id)
                     if result is not None:
                         return result
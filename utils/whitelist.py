@@ -1,9 +1,10 @@
 import os
 import re
 from collections import defaultdict
-from typing import List, Pattern
+from typing import Iterator, List, Pattern
 
 import utils.constants as constants
+from utils.matcher import KeywordMatcher
 from utils.tools import get_real_path, resource_path
 from utils.types import WhitelistMaps
 
@@ -56,7 +57,39 @@ def load_whitelist_maps(path: str = constants.whitelist_path) -> WhitelistMaps:
     return exact, keywords
 
 
-def is_url_whitelisted(data_map: WhitelistMaps, url: str, channel_name: str | None = None) -> bool:
+class WhitelistMatcher:
+    """
+    Whitelist maps compiled for matching: hash sets for the exact entries and a keyword matcher
+    per channel. Unpacks like the maps tuple: exact_map, keyword_map = matcher
+    """
+
+    def __init__(self, data_map: WhitelistMaps):
+        self.exact_map, self.keyword_map = data_map
+        self.exact = {
+            key: {candidate.strip() for candidate in candidates if candidate and candidate.strip()}
+            for key, candidates in self.exact_map.items()
+        }
+        self.keywords = {key: KeywordMatcher(keywords) for key, keywords in self.keyword_map.items()}
+
+    def __iter__(self) -> Iterator[dict[str, list[str]]]:
+        yield self.exact_map
+        yield self.keyword_map
+
+    def is_whitelisted(self, url: str, channel_name: str | None = None) -> bool:
+        """
+        Check if the URL is whitelisted for the channel or globally
+        """
+        channel_key = channel_name or ""
+        if url in self.exact.get(channel_key, ()) or url in self.exact.get("", ()):
+            return True
+        for key in (channel_key, ""):
+            matcher = self.keywords.get(key)
+            if matcher and matcher.search(url):
+                return True
+        return False
+
+
+def is_url_whitelisted(data_map: WhitelistMaps | WhitelistMatcher, url: str, channel_name: str | None = None) -> bool:
     """
     Check if the given URL is whitelisted for the specified channel.
     If channel_name is None, only global whitelist entries are considered.
@@ -69,6 +102,9 @@ def is_url_whitelisted(data_map: WhitelistMaps, url: str, channel_name: str | No
     if not url or not data_map:
         return False
 
+    if isinstance(data_map, WhitelistMatcher):
+        return data_map.is_whitelisted(url, channel_name)
+
     exact_map, keyword_map = data_map
     channel_key = channel_name or ""
 